@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 import datetime
+import json
 import pkgutil
-import re
 import sys
+import time
 import traceback
 from io import StringIO
 from logging import Logger
@@ -23,11 +25,28 @@ from typing import (
 import aiohttp
 import asyncpg
 import discord
-from cachetools import TTLCache
 from discord.abc import Messageable
 from discord.ext import commands
 
-from utils import MESSAGE_RE, Config, EmojiInputType, Emojis, update_pokemon
+from utils import (
+    MESSAGE_RE,
+    Config,
+    DownloadCache,
+    DownloadFiles,
+    DownloadScheduler,
+    EmojiInputType,
+    Emojis,
+    GridRenderer,
+    ImageArchiver,
+    ImagePool,
+    Ingestor,
+    ResponseCache,
+    TileCache,
+    Upstreams,
+    YtdlPool,
+    update_pokemon,
+)
+from utils.cache import ExpiringCache
 from .cache import db_cache
 
 if TYPE_CHECKING:
@@ -51,20 +70,14 @@ async def get_prefix(bot: Fishie, message: discord.Message) -> List[str]:
     if message.guild is None:
         return commands.when_mentioned_or(*default)(bot, message)
 
-    try:
-        prefixes = bot.db_cache.prefixes[message.guild.id]
-    except:  # SHUT UP
-        prefixes = []
-
-    packed = default + list(prefixes)
-
-    comp = re.compile("^(" + "|".join(map(re.escape, packed)) + ").*", flags=re.I)
-    match = comp.match(message.content)
+    matcher = bot.db_cache.get_prefix_matcher(message.guild.id, default)
+    match = matcher.match(message.content)
 
     if match:
-        return commands.when_mentioned_or(*[match.group(1)])(bot, message)
+        return commands.when_mentioned_or(match.group(1))(bot, message)
 
-    return commands.when_mentioned_or(*packed)(bot, message)
+    prefixes = bot.db_cache.get_prefixes(message.guild.id)
+    return commands.when_mentioned_or(*default, *prefixes)(bot, message)
 
 
 class Fishie(commands.Bot):
@@ -82,7 +95,7 @@ class Fishie(commands.Bot):
         testing: bool = False,
     ):
         self.config: Config = config
-        self.db_cache = db_cache()
+        self.db_cache = db_cache(**config.get("cache", {}))
         self.logger: Logger = logger
         self.pool = pool
         self.session = session
@@ -98,10 +111,35 @@ class Fishie(commands.Bot):
         self.dagpi_rl = commands.CooldownMapping.from_cooldown(
             60.0, 60.0, commands.BucketType.default
         )
-        self.messages: TTLCache[str, discord.Message] = TTLCache(
-            maxsize=1000, ttl=300.0
-        )  # {repr(ctx): message(from ctx.send) }
+        # {(channel_id, message_id): {nth ctx.send: message}}
+        self.messages: ExpiringCache = ExpiringCache(300.0, maxsize=10_000)
         self.support_invite: str = f"https://discord.gg/Fct5UGadcb"
+        self.cache_listener: Optional["asyncpg.Connection[asyncpg.Record]"] = None
+        self.cache_reconnect: Optional[asyncio.Task[None]] = None
+        # changes notified while populate_cache runs, replayed onto the new cache
+        self._cache_backlogs: List[List[Tuple[str, Any, Any]]] = []
+        self.ingest = Ingestor(
+            self.dsn,
+            max_rows=1000,
+            flush_interval=2.0,
+        )
+        self.downloads = DownloadScheduler(**config.get("downloads", {}))
+        self.download_cache = DownloadCache()
+        self.download_files = DownloadFiles()
+        self.ytdl = YtdlPool(self.downloads.concurrency)
+        self.upstreams = Upstreams(config.get("upstreams"))
+        self.responses = ResponseCache()
+        self.images = ImagePool(**config.get("images", {}))
+        self.tiles = TileCache()
+        self.grids = GridRenderer(self.images, self.tiles)
+        self.archive = ImageArchiver(
+            pool,
+            config["webhooks"]["images"],
+            self.upstreams["webhooks"],
+            self.images,
+            self.tiles,
+            **config.get("archive", {}),
+        )
 
         super().__init__(
             command_prefix=get_prefix,
@@ -119,18 +157,17 @@ class Fishie(commands.Bot):
     async def on_raw_message_delete(
         self, payload: discord.RawMessageDeleteEvent
     ) -> None:
-        _repr_regex = f"<extensions\\.context bound to message \\({payload.channel_id}-{payload.message_id}-[0-9]+\\)>"
-        pattern = re.compile(_repr_regex)
-        messages = {r: m for r, m in self.messages.items() if pattern.fullmatch(r)}
-        for _repr, message in messages.items():
+        responses: Optional[Dict[int, discord.Message]] = self.messages.pop(
+            (payload.channel_id, payload.message_id), None
+        )
+        if not responses:
+            return
+
+        for message in responses.values():
             try:
                 await message.delete()
             except discord.HTTPException:
                 pass
-            try:
-                del self.messages[_repr]
-            except KeyError:
-                pass
 
     def too_big(self, text: str) -> discord.File:
         s = StringIO()
@@ -201,16 +238,32 @@ class Fishie(commands.Bot):
                 continue
 
     async def setup_hook(self) -> None:
+        start = time.perf_counter()
+
         with open("schema.sql") as fp:
             await self.pool.execute(fp.read())
 
+        await self.ingest.start()
+        # before the archiver starts writing tiles
+        await self.tiles.load()
+        self.archive.start()
+        # the index of what's cached doesn't survive restarts, so neither do the files
+        await self.download_cache.clear()
+        await self.responses.prune()
+        self.ytdl.start()
+        self.images.start()
         await self.load_extensions()
+        await self.listen_for_cache_changes()
         await self.populate_cache()
         await update_pokemon(self)
         self.logger.info(f"Added {len(self.pokemon):,} pokemon")
 
         self.error_logs = discord.Webhook.from_url(
-            self.config["webhooks"]["error_logs"], session=self.session
+            self.config["webhooks"]["error_logs"],
+            session=self.upstreams["webhooks"].session,
+        )
+        self.logger.info(
+            f"Finished setup in {(time.perf_counter() - start) * 1000:.1f}ms"
         )
 
     async def on_ready(self):
@@ -258,62 +311,132 @@ class Fishie(commands.Bot):
         await super().close()
 
     async def close_sessions(self):
+        if self.cache_reconnect is not None:
+            self.cache_reconnect.cancel()
+        if self.cache_listener is not None:
+            self.cache_listener.remove_termination_listener(self.on_cache_listener_lost)
+            await self.cache_listener.close()
+            self.logger.info("Closed cache listener")
+        await self.downloads.close()
+        self.logger.info("Cancelled downloads")
+        self.ytdl.close()
+        self.logger.info("Stopped yt-dlp workers")
+        await self.archive.close()
+        self.logger.info("Stopped avatar archive workers")
+        self.images.close()
+        self.logger.info("Stopped image workers")
+        await self.ingest.close()
+        self.logger.info("Flushed ingest buffers")
         await self.pool.close()
         self.logger.info("Closed Postgres session")
+        await self.upstreams.close()
         await self.session.close()
-        self.logger.info("Closed aiohttp session")
+        self.logger.info("Closed aiohttp sessions")
 
-    async def populate_cache(self):
-        prefixes = await self.pool.fetch("""SELECT * FROM guild_prefixes""")
-
-        for record in prefixes:
-            guild_id = record["guild_id"]
-            prefix = record["prefix"]
-            self.db_cache.add_prefix(guild_id, prefix)
-            self.logger.info(f'Added prefix "{prefix}" to "{guild_id}"')
-
-        opted_out = await self.pool.fetch("SELECT * FROM opted_out")
-        for row in opted_out:
-            for item in row["items"]:
-                user_id = row["user_id"]
-                self.db_cache.add_opt_out(user_id, item)
-
-                self.logger.info(f'Added "{item}" to opted out for user "{user_id}"')
-
-        guild_opted_out = await self.pool.fetch("SELECT * FROM guild_opted_out")
-        for row in guild_opted_out:
-            for item in row["items"]:
-                guild_id = row["guild_id"]
-                self.db_cache.add_opt_out(guild_id, item)
-                self.logger.info(f'Added "{item}" to opted out for guild "{guild_id}"')
-
-        guild_settings = await self.pool.fetch("SELECT * FROM guild_settings")
-        for row in guild_settings:
-            guild_id = row["guild_id"]
-            adl = row["auto_download"]
-            poketwo = row["poketwo"]
-            auto_reactions = row["auto_reactions"]
-            pinboard = row["pinboard"]
-
-            if adl:
-                self.db_cache.add_adl(adl)
-                self.logger.info(
-                    f'Added auto download channel "{adl}" to guild "{guild_id}"'
-                )
+    @property
+    def dsn(self) -> str:
+        return self.config["databases"]["psql_testing" if self.testing else "psql"]
 
-            if pinboard:
-                self.db_cache.add_pinboard(guild_id, pinboard)
-                self.logger.info(
-                    f'Added Pinboard channel "{pinboard}" to guild "{guild_id}"'
+    async def listen_for_cache_changes(self):
+        self.cache_listener = await asyncpg.connect(self.dsn)
+        await self.cache_listener.add_listener("fishie_cache", self.on_cache_notify)
+        self.cache_listener.add_termination_listener(self.on_cache_listener_lost)
+
+    def on_cache_notify(
+        self,
+        connection: "asyncpg.Connection[asyncpg.Record]",
+        pid: int,
+        channel: str,
+        payload: str,
+    ):
+        data = json.loads(payload)
+        change = (data["table"], data["old"], data["new"])
+        self.db_cache.apply_change(*change)
+        for backlog in self._cache_backlogs:
+            backlog.append(change)
+
+    def on_cache_listener_lost(self, connection: "asyncpg.Connection[asyncpg.Record]"):
+        if self.is_closed():
+            return
+
+        if self.cache_reconnect is not None and not self.cache_reconnect.done():
+            # the running reconnect checks the connection again before it returns
+            return
+
+        self.logger.warning("Lost the cache listener connection, reconnecting")
+        self.cache_reconnect = asyncio.create_task(self.reconnect_cache_listener())
+
+    async def reconnect_cache_listener(self):
+        delay = 1.0
+        while not self.is_closed():
+            try:
+                if self.cache_listener is None or self.cache_listener.is_closed():
+                    await self.listen_for_cache_changes()
+                # anything that changed while we weren't listening was missed
+                await self.populate_cache()
+            except Exception as e:
+                self.logger.warning(
+                    f"Failed to reload the cache after losing its listener: {e.__class__.__name__}: {e}"
                 )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+                continue
+
+            if not self.cache_listener.is_closed():  # type: ignore
+                return
 
-            if poketwo:
-                self.db_cache.add_poketwo(guild_id)
-                self.logger.info(f'Added auto poketwo solving to guild "{guild_id}"')
+    async def _timed_fetch(self, query: str) -> Tuple[List[asyncpg.Record], float]:
+        start = time.perf_counter()
+        records = await self.pool.fetch(query)
+        return records, time.perf_counter() - start
 
-            if auto_reactions:
-                self.db_cache.add_reaction_guilds(guild_id)
-                self.logger.info(f'Added auto media reactions to guild "{guild_id}"')
+    async def populate_cache(self):
+        start = time.perf_counter()
+        queries = {
+            "guild_prefixes": "SELECT guild_id, prefix FROM guild_prefixes",
+            "opted_out": "SELECT user_id, items FROM opted_out",
+            "guild_opted_out": "SELECT guild_id, items FROM guild_opted_out",
+            "guild_settings": """
+            SELECT guild_id, auto_download, poketwo, auto_reactions, pinboard
+            FROM guild_settings
+            WHERE auto_download IS NOT NULL OR pinboard IS NOT NULL
+                OR poketwo OR auto_reactions
+            """,
+        }
+
+        # changes can be committed after a fetch took its snapshot, they are
+        # still applied to the old cache and replayed, in order, onto the new one
+        backlog: List[Tuple[str, Any, Any]] = []
+        self._cache_backlogs.append(backlog)
+        try:
+            # each fetch acquires its own pool connection so these run concurrently
+            results = dict(
+                zip(
+                    queries.keys(),
+                    await asyncio.gather(*map(self._timed_fetch, queries.values())),
+                )
+            )
+
+            cache = db_cache(compact=self.db_cache.compact)
+            cache.load(
+                prefixes=results["guild_prefixes"][0],
+                opted_out=results["opted_out"][0],
+                guild_opted_out=results["guild_opted_out"][0],
+                guild_settings=results["guild_settings"][0],
+            )
+            for change in backlog:
+                cache.apply_change(*change)
+            self.db_cache = cache
+        finally:
+            self._cache_backlogs.remove(backlog)
+
+        timings = ", ".join(
+            f"{table}: {len(records):,} rows in {elapsed * 1000:.1f}ms"
+            for table, (records, elapsed) in results.items()
+        )
+        self.logger.info(
+            f"Populated cache in {(time.perf_counter() - start) * 1000:.1f}ms ({timings})"
+        )
 
     async def add_reactions(
         self,
@@ -1,89 +1,269 @@
-from typing import Any, Dict, List
+from __future__ import annotations
+
+import re
+from array import array
+from bisect import bisect_left
+from typing import (
+    AbstractSet,
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    Mapping,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+)
+
+_EMPTY: FrozenSet[str] = frozenset()
+
+
+class IdSet:
+    """A set of snowflake IDs.
+
+    By default this is a plain set, with `compact=True` the IDs are kept in a
+    sorted int64 array instead (8 bytes per ID rather than ~60) and lookups
+    are a binary search. Writes are rare compared to lookups for everything
+    stored here, so keeping the array sorted on insert is fine.
+    """
+
+    __slots__ = ("_ids", "compact")
+
+    def __init__(self, ids: Iterable[int] = (), *, compact: bool = False) -> None:
+        self.compact = compact
+        self._ids: Set[int] | array[int] = (
+            array("q", sorted(set(ids))) if compact else set(ids)
+        )
+
+    def __repr__(self) -> str:
+        return f"<IdSet size={len(self)} compact={self.compact}>"
+
+    def __contains__(self, object_id: object) -> bool:
+        if not self.compact:
+            return object_id in self._ids
+
+        ids: array[int] = self._ids  # type: ignore
+        index = bisect_left(ids, object_id)  # type: ignore
+        return index < len(ids) and ids[index] == object_id
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids)
+
+    def add(self, object_id: int) -> None:
+        if not self.compact:
+            self._ids.add(object_id)  # type: ignore
+            return
+
+        ids: array[int] = self._ids  # type: ignore
+        index = bisect_left(ids, object_id)
+        if index == len(ids) or ids[index] != object_id:
+            ids.insert(index, object_id)
+
+    def discard(self, object_id: int) -> None:
+        if not self.compact:
+            self._ids.discard(object_id)  # type: ignore
+            return
+
+        ids: array[int] = self._ids  # type: ignore
+        index = bisect_left(ids, object_id)
+        if index < len(ids) and ids[index] == object_id:
+            del ids[index]
 
 
 class db_cache:
-    prefixes: Dict[int, List[str]] = {}
-    opted_out: Dict[int, List[str]] = {}
-    auto_downloads: List[int] = []
-    poketwo_guilds: List[int] = []
-    auto_reaction_guilds: List[int] = []
-    nsfw_covers: List[int] = []
-    pinboard: Dict[int, int] = {}
-
-    def add_prefix(self, guild_id: int, prefix: str) -> List[str]:
-        try:
-            self.prefixes[guild_id].append(prefix)
-        except KeyError:
-            self.prefixes.update({guild_id: [prefix]})
+    """In-memory copy of the settings tables that are checked on every message."""
+
+    def __init__(self, *, compact: bool = False) -> None:
+        self.compact = compact
+        self.prefixes: Dict[int, Set[str]] = {}
+        self.prefix_matchers: Dict[int, Pattern[str]] = {}
+        self.opted_out: Dict[int, Set[str]] = {}
+        self.auto_downloads = IdSet(compact=compact)
+        self.poketwo_guilds = IdSet(compact=compact)
+        self.auto_reaction_guilds = IdSet(compact=compact)
+        self.nsfw_covers: Set[str] = set()
+        self.pinboard: Dict[int, int] = {}
+
+    def load(
+        self,
+        *,
+        prefixes: Iterable[Mapping[str, Any]] = (),
+        opted_out: Iterable[Mapping[str, Any]] = (),
+        guild_opted_out: Iterable[Mapping[str, Any]] = (),
+        guild_settings: Sequence[Mapping[str, Any]] = (),
+    ):
+        """Bulk loads rows selected by `Fishie.populate_cache`."""
+        for row in prefixes:
+            self.prefixes.setdefault(row["guild_id"], set()).add(row["prefix"])
+
+        for row in opted_out:
+            self.opted_out[row["user_id"]] = set(row["items"] or ())
+
+        for row in guild_opted_out:
+            self.opted_out[row["guild_id"]] = set(row["items"] or ())
+
+        self.auto_downloads = IdSet(
+            (r["auto_download"] for r in guild_settings if r["auto_download"]),
+            compact=self.compact,
+        )
+        self.poketwo_guilds = IdSet(
+            (r["guild_id"] for r in guild_settings if r["poketwo"]),
+            compact=self.compact,
+        )
+        self.auto_reaction_guilds = IdSet(
+            (r["guild_id"] for r in guild_settings if r["auto_reactions"]),
+            compact=self.compact,
+        )
+        self.pinboard = {
+            r["guild_id"]: r["pinboard"] for r in guild_settings if r["pinboard"]
+        }
 
+    def get_prefixes(self, guild_id: int) -> AbstractSet[str]:
+        return self.prefixes.get(guild_id, _EMPTY)
+
+    def add_prefix(self, guild_id: int, prefix: str) -> AbstractSet[str]:
+        self.prefix_matchers.pop(guild_id, None)
+        self.prefixes.setdefault(guild_id, set()).add(prefix)
         return self.prefixes[guild_id]
 
-    def remove_prefix(self, guild_id: int, prefix: str) -> List[str]:
+    def remove_prefix(self, guild_id: int, prefix: str) -> AbstractSet[str]:
+        self.prefix_matchers.pop(guild_id, None)
+        prefixes = self.prefixes.get(guild_id)
+        if prefixes is None:
+            return _EMPTY
+
+        prefixes.discard(prefix)
+        return prefixes
+
+    def get_prefix_matcher(self, guild_id: int, default: Sequence[str]) -> Pattern[str]:
+        """Returns the compiled prefix pattern for a guild.
+
+        Patterns are built once and dropped whenever the guild's prefixes change,
+        `default` is expected to stay the same for the lifetime of the bot.
+        Longer prefixes are tried first so "fish " wins over "f".
+        """
         try:
-            self.prefixes[guild_id].remove(prefix)
+            return self.prefix_matchers[guild_id]
         except KeyError:
-            return []
-        except ValueError:
-            return self.prefixes[guild_id]
+            pass
 
-        return self.prefixes[guild_id]
+        packed = sorted({*default, *self.get_prefixes(guild_id)}, key=len, reverse=True)
+        matcher = re.compile("^(" + "|".join(map(re.escape, packed)) + ")", flags=re.I)
+        self.prefix_matchers[guild_id] = matcher
+        return matcher
+
+    def get_pinboard(self, guild_id: int) -> Optional[int]:
+        return self.pinboard.get(guild_id)
 
     def add_pinboard(self, guild_id: int, channel_id: int):
-        self.pinboard.update({guild_id: channel_id})
+        self.pinboard[guild_id] = channel_id
 
     def remove_pinboard(self, guild_id: int, channel_id: int):
-        try:
-            del self.pinboard[guild_id]
-        except:
-            return self.pinboard[guild_id]
+        self.pinboard.pop(guild_id, None)
 
-    def add_opt_out(self, object_id: int, value: str):
-        try:
-            self.opted_out[object_id].append(value)
-        except KeyError:
-            self.opted_out.update({object_id: [value]})
+    def get_opted_out(self, object_id: int) -> AbstractSet[str]:
+        return self.opted_out.get(object_id, _EMPTY)
+
+    def is_opted_out(self, object_id: int, value: str) -> bool:
+        return value in self.opted_out.get(object_id, _EMPTY)
 
+    def add_opt_out(self, object_id: int, value: str) -> AbstractSet[str]:
+        self.opted_out.setdefault(object_id, set()).add(value)
         return self.opted_out[object_id]
 
-    def remove_opt_out(self, object_id: int, value: str):
-        try:
-            self.opted_out[object_id].remove(value)
-        except KeyError:
-            return []
-        except ValueError:
-            return self.opted_out[object_id]
+    def remove_opt_out(self, object_id: int, value: str) -> AbstractSet[str]:
+        items = self.opted_out.get(object_id)
+        if items is None:
+            return _EMPTY
 
-        return self.opted_out[object_id]
+        items.discard(value)
+        return items
 
     def add_adl(self, channel_id: int):
-        self.auto_downloads.append(channel_id)
+        self.auto_downloads.add(channel_id)
 
     def remove_adl(self, channel_id: int):
-        try:
-            self.auto_downloads.remove(channel_id)
-        except ValueError:
-            pass
+        self.auto_downloads.discard(channel_id)
+
+    def is_adl(self, channel_id: int) -> bool:
+        return channel_id in self.auto_downloads
 
     def add_poketwo(self, guild_id: int):
-        self.poketwo_guilds.append(guild_id)
+        self.poketwo_guilds.add(guild_id)
 
     def remove_poketwo(self, guild_id: int):
-        try:
-            self.poketwo_guilds.remove(guild_id)
-        except ValueError:
-            pass
+        self.poketwo_guilds.discard(guild_id)
+
+    def is_poketwo(self, guild_id: int) -> bool:
+        return guild_id in self.poketwo_guilds
 
     def add_reaction_guilds(self, guild_id: int):
-        self.auto_reaction_guilds.append(guild_id)
+        self.auto_reaction_guilds.add(guild_id)
 
     def remove_reaction_guilds(self, guild_id: int):
-        try:
-            self.auto_reaction_guilds.remove(guild_id)
-        except ValueError:
-            pass
+        self.auto_reaction_guilds.discard(guild_id)
 
-    def get_opted_out(self, object_id: int) -> List[str]:
-        try:
-            return self.opted_out[object_id]
-        except:  # idc
-            return []
+    def is_reaction_guild(self, guild_id: int) -> bool:
+        return guild_id in self.auto_reaction_guilds
+
+    def is_nsfw_cover(self, album_id: str) -> bool:
+        return album_id in self.nsfw_covers
+
+    def add_guild_settings(self, row: Mapping[str, Any]):
+        guild_id = row["guild_id"]
+
+        if row["auto_download"]:
+            self.add_adl(row["auto_download"])
+
+        if row["pinboard"]:
+            self.add_pinboard(guild_id, row["pinboard"])
+
+        if row["poketwo"]:
+            self.add_poketwo(guild_id)
+
+        if row["auto_reactions"]:
+            self.add_reaction_guilds(guild_id)
+
+    def remove_guild_settings(self, row: Mapping[str, Any]):
+        guild_id = row["guild_id"]
+
+        if row["auto_download"]:
+            self.remove_adl(row["auto_download"])
+
+        self.remove_pinboard(guild_id, row["pinboard"])
+        self.remove_poketwo(guild_id)
+        self.remove_reaction_guilds(guild_id)
+
+    def apply_change(
+        self,
+        table: str,
+        old: Optional[Mapping[str, Any]],
+        new: Optional[Mapping[str, Any]],
+    ):
+        """Applies a row change sent by the notify_cache_change trigger.
+
+        `old` is None for inserts and `new` is None for deletes. Every change is
+        idempotent so rows this process already cached are safe to re-apply."""
+        if table == "guild_prefixes":
+            if old:
+                self.remove_prefix(old["guild_id"], old["prefix"])
+            if new:
+                self.add_prefix(new["guild_id"], new["prefix"])
+
+        elif table in ("opted_out", "guild_opted_out"):
+            key = "user_id" if table == "opted_out" else "guild_id"
+            if old:
+                self.opted_out.pop(old[key], None)
+            if new:
+                self.opted_out[new[key]] = set(new["items"] or ())
+
+        elif table == "guild_settings":
+            if old:
+                self.remove_guild_settings(old)
+            if new:
+                self.add_guild_settings(new)
@@ -1,9 +1,19 @@
 from __future__ import annotations
 
 import re
-from copy import deepcopy
 from io import StringIO
-from typing import TYPE_CHECKING, Any, Callable, Dict, Generic, Optional, TypeVar
+from types import MappingProxyType
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
 import aiohttp
 import discord
@@ -16,15 +26,18 @@ if TYPE_CHECKING:
 
 T = TypeVar("T")
 
-VALID_EDIT_KWARGS: Dict[str, Any] = {
-    "content": None,
-    "embeds": [],
-    "attachments": [],
-    "suppress": False,
-    "delete_after": None,
-    "allowed_mentions": None,
-    "view": None,
-}
+# read-only, Context.send builds a fresh dict from this on every edit
+VALID_EDIT_KWARGS: Mapping[str, Any] = MappingProxyType(
+    {
+        "content": None,
+        "embeds": (),
+        "attachments": (),
+        "suppress": False,
+        "delete_after": None,
+        "allowed_mentions": None,
+        "view": None,
+    }
+)
 
 
 class ConfirmationView(discord.ui.View):
@@ -120,6 +133,9 @@ class Context(commands.Context["Fishie"]):
         super().__init__(*args, **kwargs)
         self.session = self.bot.session
         self._message_count: int = 0
+        self._response_key: Optional[Tuple[int, int]] = (
+            (self.channel.id, self.message.id) if self.message else None
+        )
         self.pool = self.bot.pool
 
     async def prompt(
@@ -219,21 +235,19 @@ class Context(commands.Context["Fishie"]):
 
         kwargs["embeds"] = embeds
 
-        if self._previous_message:
-            new_kwargs = deepcopy(VALID_EDIT_KWARGS)
-            new_kwargs["content"] = content
-            new_kwargs.update(kwargs)
-            edit_kw = {k: v for k, v in new_kwargs.items() if k in VALID_EDIT_KWARGS}
-            attachments = new_kwargs.pop("files", []) or (
-                [new_kwargs.pop("file")] if new_kwargs.get("file", None) else []
+        previous = self._previous_message
+        if previous is not None:
+            edit_kw = {k: kwargs.get(k, v) for k, v in VALID_EDIT_KWARGS.items()}
+            edit_kw["content"] = content
+            attachments = kwargs.get("files") or (
+                [kwargs["file"]] if kwargs.get("file", None) else None
             )
 
             if attachments:
                 edit_kw["attachments"] = attachments
-                new_kwargs["files"] = attachments
 
             try:
-                m = await self._previous_message.edit(**edit_kw)
+                m = await previous.edit(**edit_kw)
                 self._previous_message = m
                 self._message_count += 1
                 return m
@@ -248,18 +262,28 @@ class Context(commands.Context["Fishie"]):
 
     @property
     def _previous_message(self) -> Optional[discord.Message]:
-        if self.message:
-            try:
-                return self.bot.messages[repr(self)]
-            except KeyError:
-                return None
+        if self._response_key:
+            responses = self.bot.messages.get(self._response_key)
+            if responses:
+                return responses.get(self._message_count)
 
     @_previous_message.setter
     def _previous_message(self, message: Optional[discord.Message]) -> None:
+        key = self._response_key
+        if key is None:
+            return
+
+        responses: Dict[int, discord.Message] = self.bot.messages.get(key) or {}
         if isinstance(message, discord.Message):
-            self.bot.messages[repr(self)] = message
+            responses[self._message_count] = message
+        else:
+            responses.pop(self._message_count, None)
+
+        if responses:
+            # re-set so the entry's TTL starts over
+            self.bot.messages[key] = responses
         else:
-            self.bot.messages.pop(repr(self), None)
+            self.bot.messages.pop(key, None)
 
     def __repr__(self) -> str:
         if self.message:
@@ -32,6 +32,7 @@ from utils import (
     ReviewsPageSource,
     ReviewSender,
     Pager,
+    response_checker,
 )
 
 if TYPE_CHECKING:
@@ -669,8 +670,13 @@ class Info(Cog):
         self, ctx: Context, user: discord.User | discord.Member, hidden: bool = False
     ):
         url = f"https://manti.vendicated.dev/api/reviewdb/users/{user.id}/reviews"
-        async with ctx.session.get(url) as resp:
-            json = await resp.json()
+
+        async def fetch() -> Dict[Any, Any]:
+            async with ctx.bot.upstreams["reviewdb"].get(url) as resp:
+                response_checker(resp)
+                return await resp.json()
+
+        json = await ctx.bot.responses.get_or_fetch("reviewdb", str(user.id), fetch)
 
         data: List[Review] = [
             Review(
@@ -128,9 +128,8 @@ class Pinboard(Cog):
             return
 
         if old_message.pinned == False and message.pinned == True:
-            try:
-                pinboard = self.bot.db_cache.pinboard[guild.id]
-            except KeyError:
+            pinboard = self.bot.db_cache.get_pinboard(guild.id)
+            if pinboard is None:
                 return
 
             channel: discord.TextChannel | None = guild.get_channel(pinboard)  # type: ignore
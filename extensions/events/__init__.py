@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 from typing import TYPE_CHECKING
 
 import discord
@@ -33,8 +34,12 @@ class Events(
         self.xp_cd = commands.CooldownMapping.from_cooldown(
             1, 60, commands.BucketType.user
         )
+        self.pending_xp = {}
+        self.flushing_xp = {}
+        self.xp_lock = asyncio.Lock()
         self.error_logs = discord.Webhook.from_url(
-            bot.config["webhooks"]["error_logs"], session=bot.session
+            bot.config["webhooks"]["error_logs"],
+            session=bot.upstreams["webhooks"].session,
         )
 
 
@@ -7,7 +7,14 @@ import discord
 from discord.ext import commands
 
 from core import Cog
-from utils import VIDEOS_RE, Downloader, TenorUrlConverter, to_image, TENOR_PAGE_RE
+from utils import (
+    DownloadError,
+    Downloader,
+    Site,
+    TenorUrlConverter,
+    classify,
+    to_image,
+)
 
 if TYPE_CHECKING:
     from extensions.context import Context
@@ -20,18 +27,15 @@ class AutoDownload(Cog):
 
     @commands.Cog.listener("on_message")
     async def auto_download(self, message: discord.Message):
-        if message.channel.id not in self.bot.db_cache.auto_downloads:
+        if not self.bot.db_cache.is_adl(message.channel.id):
             return
 
         if message.author.bot:
             return
 
-        video_match = VIDEOS_RE.search(message.content)
-        tenor_match = TENOR_PAGE_RE.search(message.content)
-
-        if not tenor_match:
-            if video_match is None or video_match and video_match.group(0) == "":
-                return
+        link = classify(message.content)
+        if link is None:
+            return
 
         bucket = self.cd_mapping.get_bucket(message)
 
@@ -43,9 +47,9 @@ class AutoDownload(Cog):
 
         ctx: Context = await self.bot.get_context(message)  # type: ignore
 
-        if tenor_match:
+        if link.site is Site.tenor:
             try:
-                url = await TenorUrlConverter().convert(ctx, message.content)
+                url = await TenorUrlConverter().convert(ctx, link.url)
                 img = await to_image(ctx.session, url)
                 await ctx.send(
                     file=discord.File(img, filename="tenor.gif"), ephemeral=True
@@ -54,9 +58,18 @@ class AutoDownload(Cog):
                 return
 
             except commands.BadArgument:
-                pass
-    
+                return
+
         async with ctx.typing(ephemeral=True):
-            dl = Downloader(ctx, message.content)
-            
-            await dl.download()
+            dl = Downloader(ctx, link.url)
+
+            if await dl.send_cached():
+                return
+
+            try:
+                job = self.bot.downloads.submit(dl)
+            except DownloadError:
+                # they already have a few queued, no need to reply to every link
+                return
+
+            await job.wait()
@@ -18,7 +18,7 @@ class Reactions(Cog):
         if message.guild is None:
             return
 
-        if message.channel.id not in self.bot.db_cache.auto_reaction_guilds:
+        if not self.bot.db_cache.is_reaction_guild(message.guild.id):
             return
 
         if message.attachments:
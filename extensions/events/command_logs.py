@@ -6,6 +6,7 @@ import discord
 from discord.ext import commands
 
 from core import Cog
+from utils import CommandLog
 
 if TYPE_CHECKING:
     from context import Context
@@ -26,17 +27,13 @@ class CommandLogs(Cog):
         if ctx.command is None:
             return
 
-        sql = """
-        INSERT INTO command_logs(user_id, guild_id, channel_id, message_id, command, created_at)
-        VALUES ($1, $2, $3, $4, $5, $6)
-        """
-
-        await self.bot.pool.execute(
-            sql,
-            ctx.author.id,
-            ctx.guild.id if ctx.guild else None,
-            ctx.channel.id,
-            ctx.message.id,
-            ctx.command.name,
-            discord.utils.utcnow(),
+        await self.bot.ingest.put(
+            CommandLog(
+                ctx.author.id,
+                ctx.guild.id if ctx.guild else None,
+                ctx.channel.id,
+                ctx.message.id,
+                ctx.command.name,
+                discord.utils.utcnow(),
+            )
         )
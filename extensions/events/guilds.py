@@ -8,6 +8,7 @@ from discord.abc import Messageable
 from discord.ext import commands
 
 from core import Cog
+from utils import GuildJoinLog
 
 if TYPE_CHECKING:
     from context import Context
@@ -96,13 +97,8 @@ class Guilds(Cog):
 
         await self.post_guild(embed, guild)
 
-        sql = """
-        INSERT INTO guild_join_logs(guild_id, owner_id, time) 
-        VALUES($1, $2, $3)
-        """
-
-        await self.bot.pool.execute(
-            sql, guild.id, guild.owner_id, discord.utils.utcnow()
+        await self.bot.ingest.put(
+            GuildJoinLog(guild.id, guild.owner_id, discord.utils.utcnow())
         )
 
     @commands.Cog.listener("on_guild_remove")
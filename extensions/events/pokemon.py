@@ -44,7 +44,7 @@ class Pokemon(Cog):
         if message.guild is None:
             return
 
-        if message.guild.id not in self.bot.db_cache.poketwo_guilds:
+        if not self.bot.db_cache.is_poketwo(message.guild.id):
             return
 
         try:
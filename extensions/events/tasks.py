@@ -1,15 +1,13 @@
 from __future__ import annotations
 
 import base64
-import os
 import re
-import subprocess
 from typing import TYPE_CHECKING, Any, Dict
 
 from discord.ext import commands, tasks
 
 from core import Cog
-from utils import run
+from utils import natural_size, run
 
 
 class Tasks(Cog):
@@ -29,7 +27,9 @@ class Tasks(Cog):
             "grant_type": "client_credentials",
         }
 
-        async with self.bot.session.post(url, headers=headers, data=data) as r:
+        async with self.bot.upstreams["spotify"].post(
+            url, headers=headers, data=data
+        ) as r:
             results: Dict[Any, Any] = await r.json()
             if results.get("access_token"):
                 self.bot.spotify_key = results["access_token"]
@@ -37,22 +37,12 @@ class Tasks(Cog):
 
             raise commands.BadArgument("Unable to set spotify key.")
 
-    def delete_videos(self):
-        valid_formats = (
-            "mp4",
-            "webm",
-            "mov",
-            "mp3",
-            "ogg",
-            "wav",
-            "part",
-            "ytdl",
-        )
-        for file in os.listdir(r"files/downloads"):
-            if file.endswith(valid_formats):
-                subprocess.run(
-                    [f"rm {file}"], shell=True, cwd="files/downloads", check=False
-                )
+    async def delete_videos(self):
+        removed, freed = await self.bot.download_files.sweep()
+        if removed:
+            self.bot.logger.info(
+                f"Swept {removed} stale downloaded files ({natural_size(freed)})"
+            )
 
     @tasks.loop(minutes=30.0)
     async def set_key_task(self):
@@ -61,11 +51,13 @@ class Tasks(Cog):
     async def cog_unload(self):
         self.set_key_task.cancel()
         self.delete_videos_task.cancel()
+        await super().cog_unload()
 
     async def cog_load(self) -> None:
         self.set_key_task.start()
         self.delete_videos_task.start()
+        await super().cog_load()
 
     @tasks.loop(minutes=10.0)
     async def delete_videos_task(self):
-        self.delete_videos()
+        await self.delete_videos()
@@ -1,14 +1,15 @@
 from __future__ import annotations
 
+import asyncio
 import base64
 import os
 import random
 import re
-from typing import TYPE_CHECKING, Any, Dict
+from typing import TYPE_CHECKING, Any, Dict, Tuple
 
 import asyncpg
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 from core import Cog
 
@@ -19,20 +20,72 @@ if TYPE_CHECKING:
 
 class XPCog(Cog):
     xp_cd: commands.CooldownMapping[discord.Message]
+    # {user_id: (messages, xp)} not written to message_xp yet
+    pending_xp: Dict[int, Tuple[int, int]]
+    flushing_xp: Dict[int, Tuple[int, int]]
+    xp_lock: asyncio.Lock
 
-    async def add_xp(
-        self, message: discord.Message, amount: int = random.randint(10, 20)
-    ):
-        sql = """
-        INSERT INTO message_xp (user_id, messages, xp) 
-        VALUES ($1, $2, $3)
-        ON CONFLICT (user_id) DO UPDATE 
-        SET messages = message_xp.messages + 1, 
-            xp = message_xp.xp + $3
-        WHERE message_xp.user_id = $1
-        """
+    def add_xp(self, message: discord.Message, amount: int = random.randint(10, 20)):
+        messages, xp = self.pending_xp.get(message.author.id, (0, 0))
+        self.pending_xp[message.author.id] = (messages + 1, xp + amount)
 
-        await self.bot.pool.execute(sql, message.author.id, 1, amount)
+    def get_pending_xp(self) -> Dict[int, int]:
+        totals = {user_id: xp for user_id, (_, xp) in self.flushing_xp.items()}
+        for user_id, (_, xp) in self.pending_xp.items():
+            totals[user_id] = totals.get(user_id, 0) + xp
+
+        return totals
+
+    async def flush_xp(self):
+        async with self.xp_lock:
+            if not self.pending_xp:
+                return
+
+            self.flushing_xp, self.pending_xp = self.pending_xp, {}
+
+            sql = """
+            INSERT INTO message_xp (user_id, messages, xp)
+            SELECT * FROM unnest($1::BIGINT[], $2::BIGINT[], $3::BIGINT[])
+            ON CONFLICT (user_id) DO UPDATE
+            SET messages = message_xp.messages + EXCLUDED.messages,
+                xp = message_xp.xp + EXCLUDED.xp
+            """
+
+            try:
+                await self.bot.pool.execute(
+                    sql,
+                    list(self.flushing_xp.keys()),
+                    [messages for messages, _ in self.flushing_xp.values()],
+                    [xp for _, xp in self.flushing_xp.values()],
+                )
+            except BaseException:
+                # put the deltas back so the next flush picks them up
+                for user_id, (messages, xp) in self.flushing_xp.items():
+                    p_messages, p_xp = self.pending_xp.get(user_id, (0, 0))
+                    self.pending_xp[user_id] = (p_messages + messages, p_xp + xp)
+                raise
+            finally:
+                self.flushing_xp = {}
+
+    @tasks.loop(seconds=30.0)
+    async def flush_xp_task(self):
+        try:
+            await self.flush_xp()
+        except Exception as e:
+            self.bot.logger.error(f"Failed to flush XP: {e.__class__.__name__}: {e}")
+
+    async def cog_load(self) -> None:
+        self.flush_xp_task.start()
+        await super().cog_load()
+
+    async def cog_unload(self) -> None:
+        # a flush already running may have committed, cancelling it would put
+        # its deltas back and the final flush would write them twice
+        async with self.xp_lock:
+            self.flush_xp_task.cancel()
+
+        await self.flush_xp()
+        await super().cog_unload()
 
     @commands.Cog.listener("on_message")
     async def xp_message(self, message: discord.Message):
@@ -45,4 +98,4 @@ class XPCog(Cog):
             if retry_after:
                 return
 
-        await self.add_xp(message)
+        self.add_xp(message)
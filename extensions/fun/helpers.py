@@ -166,7 +166,7 @@ async def dagpi(bot: Fishie, message: discord.Message, url: str) -> Dict[str, st
 
     headers = {"Authorization": bot.config["keys"]["dagpi"]}
 
-    async with bot.session.get(url, headers=headers) as r:
+    async with bot.upstreams["dagpi"].get(url, headers=headers) as r:
         if r.status == 429:
             raise commands.BadArgument("Rate limited exceeded")
 
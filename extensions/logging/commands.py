@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import asyncio
 import datetime
 from typing import TYPE_CHECKING, List, Optional, Tuple
 
@@ -13,11 +12,10 @@ from utils import (
     AvatarsPageSource,
     FieldPageSource,
     Pager,
-    format_bytes,
     format_status,
     human_timedelta,
-    to_image,
     plural,
+    tile_key,
 )
 
 if TYPE_CHECKING:
@@ -90,13 +88,16 @@ class Commands(Cog):
             if not bool(records):
                 raise commands.BadArgument(f"{user} has no avatars on record.")
 
-            avatars = await asyncio.gather(
-                *[to_image(ctx.session, row["avatar"], bytes=True) for row in records]
-            )
-
+            limit: int = ctx.guild.filesize_limit if ctx.guild else 8388608  # type: ignore
             file = discord.File(
-                await format_bytes(
-                    ctx.guild.filesize_limit if ctx.guild else 8388608, avatars  # type: ignore
+                await ctx.bot.grids.render(
+                    ctx.session,
+                    (table, tuple(row["id"] for row in records), limit),
+                    [
+                        (tile_key(row[user_id], row["avatar_key"]), row["avatar"])
+                        for row in records
+                    ],
+                    limit,
                 ),
                 f"{user.id}_avatar_history.png",
             )
@@ -1,59 +1,37 @@
 from __future__ import annotations
 
-import asyncio
 import base64
-import random
-from io import BytesIO
 from typing import TYPE_CHECKING
 
-import asyncpg
 import discord
 from discord.ext import commands
 
 from core import Cog
-from utils import resize_to_limit
+from utils import ArchiveJob, GuildNameLog
 
 if TYPE_CHECKING:
     from core import Fishie
 
 
 class Guild(Cog):
-    async def add_icon(
+    def add_icon(
         self,
         guild: discord.Guild,
         asset: discord.Asset,
-    ):
-        webhook = discord.Webhook.from_url(
-            random.choice(self.bot.config["webhooks"]["images"]),
-            session=self.bot.session,
-        )
-        try:
-            image = await asyncio.to_thread(
-                resize_to_limit, BytesIO(await asset.read()), 8388608
-            )
-            message = await webhook.send(
-                f"{guild.name} | {guild.id} | {guild.member_count:,} | {discord.utils.format_dt(discord.utils.utcnow())}",
-                file=discord.File(image, filename=f"{guild.id}_{asset.key}.png"),
-                wait=True,
-                allowed_mentions=discord.AllowedMentions.none(),
-            )
-        except discord.HTTPException:
-            return
-
-        sql = """
+    ) -> bool:
+        now = discord.utils.utcnow()
+        job = ArchiveJob(
+            (guild.id, asset.key),
+            asset,
+            f"{guild.name} | {guild.id} | {guild.member_count:,} | {discord.utils.format_dt(now)}",
+            f"{guild.id}_{asset.key}.png",
+            """
         INSERT INTO guild_icons(guild_id, icon_key, created_at, icon)
-        VALUES($1, $2, $3, $4)"""
+        VALUES($1, $2, $3, $4)""",
+            (guild.id, asset.key, now),
+        )
 
-        try:
-            await self.bot.pool.execute(
-                sql,
-                guild.id,
-                asset.key,
-                discord.utils.utcnow(),
-                message.attachments[0].url,
-            )
-        except asyncpg.UniqueViolationError:
-            pass
+        return self.bot.archive.put(job)
 
     @commands.Cog.listener("on_guild_update")
     async def icon_update(self, before_g: discord.Guild, after_g: discord.Guild):
@@ -66,14 +44,12 @@ class Guild(Cog):
         if "icon" in self.bot.db_cache.get_opted_out(after_g.id):
             return
 
-        await self.add_icon(after_g, after_g.icon)
+        self.add_icon(after_g, after_g.icon)
 
     async def add_name(self, guild: discord.Guild):
-        sql = """
-        INSERT INTO guild_name_logs(guild_id, name, created_at)
-        VALUES($1, $2, $3)"""
-
-        await self.bot.pool.execute(sql, guild.id, guild.name, discord.utils.utcnow())
+        await self.bot.ingest.put(
+            GuildNameLog(guild.id, guild.name, discord.utils.utcnow())
+        )
 
     @commands.Cog.listener("on_guild_update")
     async def name_update(self, before_g: discord.Guild, after_g: discord.Guild):
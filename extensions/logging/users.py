@@ -4,16 +4,14 @@ import discord
 from discord.ext import commands
 
 from core import Cog
+from utils import DisplayNameLog, MemberJoinLog, NicknameLog, StatusLog, UsernameLog
 
 
 class User(Cog):
     async def add_username(self, user: discord.User):
-        sql = """
-        INSERT INTO username_logs(user_id, username, created_at)
-        VALUES ($1, $2, $3)
-        """
-
-        await self.bot.pool.execute(sql, user.id, user.name, discord.utils.utcnow())
+        await self.bot.ingest.put(
+            UsernameLog(user.id, user.name, discord.utils.utcnow())
+        )
 
     @commands.Cog.listener("on_user_update")
     async def username_update(self, before_u: discord.User, after_u: discord.User):
@@ -26,13 +24,8 @@ class User(Cog):
         await self.add_username(after_u)
 
     async def add_display_name(self, user: discord.User):
-        sql = """
-        INSERT INTO display_name_logs(user_id, display_name, created_at)
-        VALUES($1, $2, $3)
-        """
-
-        await self.bot.pool.execute(
-            sql, user.id, user.display_name, discord.utils.utcnow()
+        await self.bot.ingest.put(
+            DisplayNameLog(user.id, user.display_name, discord.utils.utcnow())
         )
 
     @commands.Cog.listener("on_user_update")
@@ -46,13 +39,8 @@ class User(Cog):
         await self.add_display_name(after_u)
 
     async def add_nickname(self, member: discord.Member):
-        sql = """
-        INSERT INTO nickname_logs(user_id, guild_id, nickname, created_at)
-        VALUES($1, $2, $3, $4)
-        """
-
-        await self.bot.pool.execute(
-            sql, member.id, member.guild.id, member.nick, discord.utils.utcnow()
+        await self.bot.ingest.put(
+            NicknameLog(member.id, member.guild.id, member.nick, discord.utils.utcnow())
         )
 
     @commands.Cog.listener("on_member_update")
@@ -69,13 +57,10 @@ class User(Cog):
         await self.add_nickname(after_m)
 
     async def add_status(self, member: discord.Member):
-        sql = """
-        INSERT INTO status_logs(user_id, status_name, guild_id, created_at)
-        VALUES($1, $2, $3, $4)
-        """
-
-        await self.bot.pool.execute(
-            sql, member.id, member.status.name, member.guild.id, discord.utils.utcnow()
+        await self.bot.ingest.put(
+            StatusLog(
+                member.id, member.status.name, member.guild.id, discord.utils.utcnow()
+            )
         )
 
     @commands.Cog.listener("on_presence_update")
@@ -89,13 +74,8 @@ class User(Cog):
         await self.add_status(after_m)
 
     async def add_join(self, member: discord.Member):
-        sql = """
-        INSERT INTO member_join_logs(member_id, guild_id, time)
-        VALUES($1, $2, $3)
-        """
-
-        await self.bot.pool.execute(
-            sql, member.id, member.guild.id, discord.utils.utcnow()
+        await self.bot.ingest.put(
+            MemberJoinLog(member.id, member.guild.id, discord.utils.utcnow())
         )
 
     @commands.Cog.listener("on_member_join")
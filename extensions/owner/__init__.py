@@ -7,7 +7,7 @@ from discord.abc import Messageable
 from discord.ext import commands
 
 from core import Cog
-from utils import fish_owner, greenTick, AllMsgbleChannels
+from utils import fish_owner, greenTick, AllMsgbleChannels, natural_size
 
 if TYPE_CHECKING:
     from core import Fishie
@@ -58,6 +58,91 @@ class Owner(Cog):
 
         await self._add_reaction(ctx, ctx.message)
 
+    @commands.command(name="buffers")
+    async def buffers(self, ctx: Context):
+        """Shows the state of the write-behind buffers"""
+        ingest = ctx.bot.ingest
+        archive = ctx.bot.archive
+        stats = archive.stats
+        lines = [
+            f"depth: {ingest.depth:,} | journaled: {ingest.spilled:,} | replayed: {ingest.replayed:,}",
+            f"archive | backlog: {archive.backlog:,} | archived: {stats.archived:,} | "
+            f"duplicates: {stats.duplicates:,} | dropped: {stats.dropped:,} | failed: {stats.failed:,} | "
+            f"upload: {stats.last_upload * 1000:.0f}ms last, {stats.average_upload * 1000:.0f}ms avg, "
+            f"{stats.max_upload * 1000:.0f}ms max | webhook wait: {stats.average_wait * 1000:.0f}ms avg",
+        ]
+
+        grids = ctx.bot.grids
+        tiles = ctx.bot.tiles
+        lines.append(
+            f"grids | cached: {len(grids.cache):,}, {natural_size(grids.size)} | hits: {grids.hits:,} | "
+            f"misses: {grids.misses:,} | failed tiles: {grids.failed_tiles:,} | downloaded tiles: {grids.downloaded_tiles:,}"
+        )
+        lines.append(
+            f"tiles | cached: {len(tiles):,}, {natural_size(tiles.size)} | hits: {tiles.hits:,} | "
+            f"misses: {tiles.misses:,} | evictions: {tiles.evictions:,}"
+        )
+        for name, job in ctx.bot.images.stats.items():
+            lines.append(
+                f"images `{name}` | jobs: {job.jobs:,} | failures: {job.failures:,} | "
+                f"in: {natural_size(job.bytes_in)} | out: {natural_size(job.bytes_out)} | "
+                f"time: {job.last_time * 1000:.0f}ms last, {job.average_time * 1000:.0f}ms avg, {job.max_time * 1000:.0f}ms max"
+            )
+
+        for writer in ingest.writers.values():
+            stats = writer.stats
+            lines.append(
+                f"`{writer.table}` | depth: {writer.depth:,} | rows: {stats.rows:,} | "
+                f"flushes: {stats.flushes:,} | failures: {stats.failures:,} | "
+                f"latency: {stats.last_latency * 1000:.2f}ms last, "
+                f"{stats.average_latency * 1000:.2f}ms avg, {stats.max_latency * 1000:.2f}ms max"
+            )
+
+        await ctx.send("\n".join(lines))
+
+    @commands.command(name="downloads")
+    async def downloads(self, ctx: Context):
+        """Shows the state of the download scheduler"""
+        scheduler = ctx.bot.downloads
+        cache = ctx.bot.download_cache
+        files = ctx.bot.download_files
+        disk_files, disk_bytes = await files.usage()
+        stats = scheduler.stats
+        lines = [
+            f"running: {scheduler.running}/{scheduler.concurrency} | queued: {scheduler.queued:,}",
+            f"submitted: {stats.submitted:,} | completed: {stats.completed:,} | "
+            f"failed: {stats.failed:,} | cancelled: {stats.cancelled:,} | rejected: {stats.rejected:,}",
+            f"downloaded: {natural_size(stats.bytes)}",
+            f"wait: {stats.average_wait:.2f}s avg, {stats.max_wait:.2f}s max | "
+            f"run: {stats.average_run:.2f}s avg, {stats.max_run:.2f}s max",
+            f"yt-dlp: {ctx.bot.ytdl.workers} workers | jobs: {ctx.bot.ytdl.jobs:,} | failures: {ctx.bot.ytdl.failures:,}",
+            f"cache: {len(cache):,} entries, {natural_size(cache.size)} | hits: {cache.hits:,} | "
+            f"misses: {cache.misses:,} | coalesced: {cache.coalesced:,} | evictions: {cache.evictions:,}",
+            f"disk: {disk_files:,} files, {natural_size(disk_bytes)} in `{files.root}` | "
+            f"in use: {len(files.active):,} | cleaned up: {files.removed:,} files, {natural_size(files.freed)}",
+        ]
+
+        await ctx.send("\n".join(lines))
+
+    @commands.command(name="upstreams")
+    async def upstreams(self, ctx: Context):
+        """Shows latency and errors of the external APIs"""
+        responses = ctx.bot.responses
+        lines = [
+            f"response cache: {len(responses):,} entries | hits: {responses.hits:,} | "
+            f"disk hits: {responses.disk_hits:,} | misses: {responses.misses:,} | coalesced: {responses.coalesced:,}"
+        ]
+        for upstream in ctx.bot.upstreams.values():
+            latency = upstream.latency
+            lines.append(
+                f"`{upstream.name}` | {upstream.breaker.state} | requests: {upstream.requests:,} | "
+                f"errors: {upstream.errors:,} | retried: {upstream.retried:,} | refused: {upstream.refused:,} | "
+                f"p50: {latency.percentile(0.5) * 1000:.0f}ms, p95: {latency.percentile(0.95) * 1000:.0f}ms, "
+                f"max: {latency.max * 1000:.0f}ms"
+            )
+
+        await ctx.send("\n".join(lines))
+
     @commands.command(name="test")
     async def test(self, ctx: Context, user: discord.User = commands.Author): ...
 
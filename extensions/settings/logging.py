@@ -57,13 +57,11 @@ class Dropdown(discord.ui.Select):
         value = self.values[0]
         ctx = self.ctx
 
-        results = ctx.bot.db_cache.opted_out[ctx.author.id]
-
-        if value in results:
+        if ctx.bot.db_cache.is_opted_out(ctx.author.id, value):
             sql = """UPDATE opted_out SET items = array_remove(opted_out.items, $1) WHERE user_id = $2"""
 
             await ctx.bot.pool.execute(sql, value, ctx.author.id)
-            results.remove(value)
+            ctx.bot.db_cache.remove_opt_out(ctx.author.id, value)
             emoji = "\U0001f7e2"
         else:
             sql = """
@@ -74,7 +72,7 @@ class Dropdown(discord.ui.Select):
             """
 
             await ctx.bot.pool.execute(sql, ctx.author.id, value)
-            results.append(value)
+            ctx.bot.db_cache.add_opt_out(ctx.author.id, value)
             emoji = "\U0001f534"
 
         self.data.update({value: [self.data[value][0], emoji]})
@@ -86,9 +84,7 @@ class Dropdown(discord.ui.Select):
         if self.guild_id is None:
             raise ValueError("Not in a guild")
 
-        results = ctx.bot.db_cache.opted_out[self.guild_id]
-
-        if value in results:
+        if ctx.bot.db_cache.is_opted_out(self.guild_id, value):
             sql = """UPDATE guild_opted_out SET items = array_remove(guild_opted_out.items, $1) WHERE guild_id = $2"""
 
             await ctx.bot.pool.execute(sql, value, self.guild_id)
@@ -90,7 +90,7 @@ class Server(Cog):
         if len(prefix) > 10:
             raise commands.BadArgument("Prefixes can only be 10 characters long.")
 
-        if prefix in bot.db_cache.prefixes[ctx.guild.id]:
+        if prefix in bot.db_cache.get_prefixes(ctx.guild.id):
             raise commands.BadArgument("This prefix is already set.")
 
         sql = """INSERT INTO guild_prefixes (guild_id, prefix, author_id, time) VALUES ($1, $2, $3, $4)"""
@@ -107,7 +107,7 @@ class Server(Cog):
         """Remove a prefix from the server"""
         bot = self.bot
 
-        if prefix not in bot.db_cache.prefixes[ctx.guild.id]:
+        if prefix not in bot.db_cache.get_prefixes(ctx.guild.id):
             raise commands.BadArgument(
                 "This prefix does not exist. Check your spelling and try again."
             )
@@ -18,6 +18,7 @@ from utils import (
     URLConverter,
     get_or_fetch_user,
     AuthorView,
+    response_checker,
 )
 from utils.emojis import user, fish_trash, fish_check
 
@@ -152,12 +153,18 @@ class Tools(Downloads, Reminder, Google, Spotify, PurgeCog):
 
         url = "https://api.urbandictionary.com/v0/define"
 
-        async with ctx.session.get(url, params={"term": word}) as resp:
-            json = await resp.json()
-            data: List[Dict[Any, Any]] = json.get("list", [])
+        async def fetch() -> Dict[Any, Any]:
+            async with ctx.bot.upstreams["urban"].get(
+                url, params={"term": word}
+            ) as resp:
+                response_checker(resp)
+                return await resp.json()
 
-            if not data:
-                raise commands.BadArgument("Nothing was found for this phrase.")
+        json = await ctx.bot.responses.get_or_fetch("urban", word, fetch)
+        data: List[Dict[Any, Any]] = json.get("list", [])
+
+        if not data:
+            raise commands.BadArgument("Nothing was found for this phrase.")
 
         p = UrbanPageSource(data, per_page=4)
         menu = Pager(p, ctx=ctx)
@@ -170,6 +177,10 @@ class Tools(Downloads, Reminder, Google, Spotify, PurgeCog):
             "SELECT xp FROM message_xp WHERE user_id = $1", user.id
         )
 
+        if self.bot.events:
+            pending = self.bot.events.get_pending_xp().get(user.id, 0)
+            xp = (xp or 0) + pending
+
         if not bool(xp):
             raise commands.BadArgument("This user has no recorded XP")
 
@@ -184,8 +195,19 @@ class Tools(Downloads, Reminder, Google, Spotify, PurgeCog):
     @commands.hybrid_command(name="leaderboard", aliases=("lb",))
     async def leaderboard(self, ctx: Context):
         """Check the global XP leaderboard"""
+        pending = self.bot.events.get_pending_xp() if self.bot.events else {}
+
+        sql = """
+        SELECT COALESCE(m.user_id, p.user_id) AS user_id,
+               COALESCE(m.xp, 0) + COALESCE(p.xp, 0) AS xp
+        FROM message_xp m
+        FULL OUTER JOIN unnest($1::BIGINT[], $2::BIGINT[]) AS p(user_id, xp)
+        ON m.user_id = p.user_id
+        ORDER BY xp DESC LIMIT 100
+        """
+
         xp = await self.bot.pool.fetch(
-            "SELECT user_id, xp FROM message_xp ORDER BY xp DESC LIMIT 100",
+            sql, list(pending.keys()), list(pending.values())
         )
 
         if not bool(xp):
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import os
 import secrets
 from typing import TYPE_CHECKING, Literal
@@ -7,7 +8,15 @@ from typing import TYPE_CHECKING, Literal
 import discord
 from discord.ext import commands
 from core import Cog
-from utils import Downloader, TenorUrlConverter, to_image
+from utils import (
+    DownloadJob,
+    Downloader,
+    Site,
+    TenorUrlConverter,
+    classify,
+    plural,
+    to_image,
+)
 from discord import app_commands
 
 if TYPE_CHECKING:
@@ -44,17 +53,19 @@ class Downloads(Cog):
         """Download a video off the internet"""
         
         async with ctx.typing(ephemeral=flags.hidden):
-            try:
-                url = await TenorUrlConverter().convert(ctx, url)
-                img = await to_image(ctx.session, url)
-                await ctx.send(
-                    file=discord.File(img, filename="tenor.gif"), ephemeral=True
-                )
+            link = classify(url)
+            if link is not None and link.site is Site.tenor:
+                try:
+                    url = await TenorUrlConverter().convert(ctx, link.url)
+                    img = await to_image(ctx.session, url)
+                    await ctx.send(
+                        file=discord.File(img, filename="tenor.gif"), ephemeral=True
+                    )
 
-                return
+                    return
 
-            except commands.BadArgument:
-                pass
+                except commands.BadArgument:
+                    pass
 
             dl = Downloader(
                 ctx,
@@ -64,4 +75,46 @@ class Downloads(Cog):
                 filename=flags.title,
             )
 
-            await dl.download()
+            if await dl.send_cached():
+                return
+
+            job = ctx.bot.downloads.submit(dl)
+            notice = None
+            updater = None
+            if job.position:
+                notice = await ctx.send(
+                    f"Your download is #{job.position} in the queue.",
+                    ephemeral=flags.hidden,
+                )
+                updater = asyncio.create_task(self._update_position(job, notice))
+
+            try:
+                await job.wait()
+            finally:
+                if updater:
+                    updater.cancel()
+
+            if notice:
+                try:
+                    await notice.delete()
+                except discord.HTTPException:
+                    pass
+
+    async def _update_position(self, job: DownloadJob, notice: discord.Message):
+        async for position in job.positions():
+            try:
+                await notice.edit(content=f"Your download is #{position} in the queue.")
+            except discord.HTTPException:
+                return
+
+            # a busy queue moves faster than messages can be edited
+            await asyncio.sleep(2.0)
+
+    @commands.hybrid_command(name="canceldownloads", aliases=("dlcancel",))
+    @app_commands.allowed_installs(guilds=True, users=True)
+    @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+    async def cancel_downloads(self, ctx: Context):
+        """Cancel your queued and running downloads"""
+        cancelled = ctx.bot.downloads.cancel_user(ctx.author.id)
+
+        await ctx.send(f"Cancelled {plural(cancelled):download}.", ephemeral=True)
@@ -38,6 +38,11 @@ class Google(Cog):
     def __init__(self, bot: Fishie) -> None:
         self.bot = bot
 
+    async def google_request(self, url: str, params: Dict[str, Any]) -> Dict[Any, Any]:
+        async with self.bot.upstreams["google"].get(url, params=params) as r:
+            response_checker(r)
+            return await r.json()
+
     @commands.hybrid_command(name="google")
     async def google(self, ctx: Context, *, query: str):
         """Search something on the web"""
@@ -62,30 +67,30 @@ class Google(Cog):
         }
         await ctx.typing()
 
-        async with self.bot.session.get(url, params=params) as r:
-            response_checker(r)
-            data = await r.json()
+        data = await self.bot.responses.get_or_fetch(
+            "google", query, lambda: self.google_request(url, params), params["safe"]
+        )
 
-            embed = discord.Embed(color=discord.Colour.pink())
-            embed.set_footer(
-                text=f"About {data['searchInformation']['formattedTotalResults']} results ({data['searchInformation']['formattedSearchTime']} seconds)"
-            )
+        embed = discord.Embed(color=discord.Colour.pink())
+        embed.set_footer(
+            text=f"About {data['searchInformation']['formattedTotalResults']} results ({data['searchInformation']['formattedSearchTime']} seconds)"
+        )
 
-            embed.title = f"Google Search - {query}"[:256]
+        embed.title = f"Google Search - {query}"[:256]
 
-            text = ""
-            items = data["items"]
+        text = ""
+        items = data["items"]
 
-            added = 0
-            for item in items:
-                if added == 5:
-                    break
-                try:
-                    text += f"[{item['title']}]({item['link']})\n{item['snippet']}\n\n"
-                    added += 1
-                except KeyError:
-                    continue
-            embed.description = text
+        added = 0
+        for item in items:
+            if added == 5:
+                break
+            try:
+                text += f"[{item['title']}]({item['link']})\n{item['snippet']}\n\n"
+                added += 1
+            except KeyError:
+                continue
+        embed.description = text
 
         await ctx.send(embed=embed)
 
@@ -117,25 +122,28 @@ class Google(Cog):
         }
 
         await ctx.typing()
-        async with self.bot.session.get(url, params=params) as r:
-            response_checker(r)
-            results = await r.json()
+        results = await self.bot.responses.get_or_fetch(
+            "google_image",
+            query,
+            lambda: self.google_request(url, params),
+            params["safe"],
+        )
 
-            items = results.get("items")
+        items = results.get("items")
 
-            if items is None:
-                raise commands.BadArgument("No search results found for this query.")
+        if items is None:
+            raise commands.BadArgument("No search results found for this query.")
 
-            entries = [
-                GoogleImageData(
-                    image_url=data["link"],
-                    url=data["image"]["contextLink"],
-                    snippet=data["snippet"],
-                    query=query,
-                    author=ctx.author,
-                )
-                for data in results["items"]
-            ]
+        entries = [
+            GoogleImageData(
+                image_url=data["link"],
+                url=data["image"]["contextLink"],
+                snippet=data["snippet"],
+                query=query,
+                author=ctx.author,
+            )
+            for data in results["items"]
+        ]
 
         pager = Pager(GoogleImagePageSource(entries), ctx=ctx)
         await pager.start(ctx)
@@ -156,13 +164,13 @@ class Google(Cog):
         }
 
         await ctx.typing()
-        async with self.bot.session.get(url, params=params) as r:
-            response_checker(r)
-            data = await r.json()
-            try:
-                url = f"https://www.youtube.com/{link_converter[type]}{data['items'][0]['id'][id_converter[type]]}"
-            except (IndexError, KeyError):
-                raise commands.BadArgument("Couldn't find any results.")
+        data = await self.bot.responses.get_or_fetch(
+            "youtube", query, lambda: self.google_request(url, params), type
+        )
+        try:
+            url = f"https://www.youtube.com/{link_converter[type]}{data['items'][0]['id'][id_converter[type]]}"
+        except (IndexError, KeyError):
+            raise commands.BadArgument("Couldn't find any results.")
 
         videos = data["items"]
         view = YoutubeView(ctx, videos, type)
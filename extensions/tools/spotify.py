@@ -38,11 +38,17 @@ class Spotify(Cog):
 
         api_data = {"q": query, "type": mode, "limit": "10", "market": "US"}
 
-        async with ctx.session.get(url, headers=headers, params=api_data) as resp:
-            response_checker(resp)
-            data: Optional[Dict[Any, Any]] = (
-                (await resp.json()).get(self.format_mode[mode]).get(f"items")
-            )
+        async def fetch() -> Dict[Any, Any]:
+            async with ctx.bot.upstreams["spotify"].get(
+                url, headers=headers, params=api_data
+            ) as resp:
+                response_checker(resp)
+                return await resp.json()
+
+        results = await ctx.bot.responses.get_or_fetch("spotify", query, fetch, mode)
+        data: Optional[Dict[Any, Any]] = results.get(self.format_mode[mode]).get(
+            f"items"
+        )
 
         if data == [] or data is None:
             raise commands.BadArgument("No info found for this query")
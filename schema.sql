@@ -266,4 +266,40 @@ CREATE TABLE IF NOT EXISTS sold_fish (
     leviathan BIGINT,
     kraken BIGINT,
     PRIMARY KEY (user_id)
-);
\ No newline at end of file
+);
+
+-- keeps db_cache in sync across processes, see Fishie.listen_for_cache_changes
+CREATE OR REPLACE FUNCTION notify_cache_change() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify(
+        'fishie_cache',
+        jsonb_build_object(
+            'table', TG_TABLE_NAME,
+            'op', TG_OP,
+            'old', CASE WHEN TG_OP IN ('UPDATE', 'DELETE') THEN to_jsonb(OLD) END,
+            'new', CASE WHEN TG_OP IN ('INSERT', 'UPDATE') THEN to_jsonb(NEW) END
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS guild_prefixes_cache_notify ON guild_prefixes;
+CREATE TRIGGER guild_prefixes_cache_notify
+    AFTER INSERT OR UPDATE OR DELETE ON guild_prefixes
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_change();
+
+DROP TRIGGER IF EXISTS opted_out_cache_notify ON opted_out;
+CREATE TRIGGER opted_out_cache_notify
+    AFTER INSERT OR UPDATE OR DELETE ON opted_out
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_change();
+
+DROP TRIGGER IF EXISTS guild_opted_out_cache_notify ON guild_opted_out;
+CREATE TRIGGER guild_opted_out_cache_notify
+    AFTER INSERT OR UPDATE OR DELETE ON guild_opted_out
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_change();
+
+DROP TRIGGER IF EXISTS guild_settings_cache_notify ON guild_settings;
+CREATE TRIGGER guild_settings_cache_notify
+    AFTER INSERT OR UPDATE OR DELETE ON guild_settings
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_change();
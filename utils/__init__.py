@@ -1,14 +1,24 @@
+from .archive import *
+from .batching import *
 from .checks import *
 from .converters import *
+from .download_cache import *
+from .download_files import *
 from .downloads import *
 from .emojis import *
 from .errors import *
 from .formats import *
 from .functions import *
 from .fuzzy import *
+from .imaging import *
+from .links import *
 from .paginator import *
 from .regexes import *
+from .response_cache import *
+from .scheduler import *
 from .time import *
 from .types import *
+from .upstream import *
 from .vars import *
 from .views import *
+from .ytdl import *
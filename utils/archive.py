@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Deque, List, NamedTuple, Optional, Tuple
+
+import asyncpg
+import discord
+
+from .cache import ExpiringCache
+
+if TYPE_CHECKING:
+    from .imaging import ImagePool, TileCache
+    from .upstream import Upstream
+
+__all__ = (
+    "UPLOAD_LIMIT",
+    "ArchiveJob",
+    "ArchiveStats",
+    "WebhookBucket",
+    "ImageArchiver",
+)
+
+_STOP = object()
+
+# the biggest file a webhook can upload
+UPLOAD_LIMIT = 8_388_608
+
+
+class ArchiveJob(NamedTuple):
+    # (user, guild or member ID, asset key), nothing is downloaded twice for one
+    key: Tuple[Any, ...]
+    asset: discord.Asset
+    content: str
+    filename: str
+    # the uploaded URL is passed after `args`
+    sql: str
+    args: Tuple[Any, ...]
+    # the name its thumbnail is cached under, see `tile_key`
+    tile: Optional[str] = None
+
+
+@dataclass()
+class ArchiveStats:
+    queued: int = 0
+    archived: int = 0
+    duplicates: int = 0
+    dropped: int = 0
+    failed: int = 0
+    last_upload: float = 0.0
+    max_upload: float = 0.0
+    total_upload: float = 0.0
+    total_wait: float = 0.0
+
+    @property
+    def average_upload(self) -> float:
+        return self.total_upload / self.archived if self.archived else 0.0
+
+    @property
+    def average_wait(self) -> float:
+        return self.total_wait / self.archived if self.archived else 0.0
+
+
+class WebhookBucket:
+    """A sliding window of the sends made through one webhook."""
+
+    __slots__ = ("webhook", "rate", "per", "sent", "blocked_until")
+
+    def __init__(self, webhook: discord.Webhook, rate: int, per: float) -> None:
+        self.webhook = webhook
+        self.rate = rate
+        self.per = per
+        self.sent: Deque[float] = deque()
+        self.blocked_until: float = 0.0
+
+    def available_at(self, now: float) -> float:
+        while self.sent and now - self.sent[0] >= self.per:
+            self.sent.popleft()
+
+        at = self.sent[0] + self.per if len(self.sent) >= self.rate else now
+        return max(at, self.blocked_until)
+
+    def hit(self, now: float) -> None:
+        self.sent.append(now)
+
+
+class ImageArchiver:
+    """Uploads avatars and icons to the image webhooks from a pool of workers.
+
+    Gateway handlers only `put` a job, which is dropped right away if the
+    same asset was queued recently or the queue is full, so a burst of
+    updates never blocks event dispatch. Workers send through whichever
+    webhook has a free slot first, keeping each one under `rate` sends per
+    `per` seconds instead of running into Discord's 429s.
+    """
+
+    def __init__(
+        self,
+        pool: "asyncpg.Pool[asyncpg.Record]",
+        urls: List[str],
+        upstream: Upstream,
+        images: ImagePool,
+        tiles: TileCache,
+        *,
+        workers: int = 2,
+        max_queue: int = 1000,
+        rate: int = 5,
+        per: float = 2.0,
+    ) -> None:
+        self.pool = pool
+        self.urls = urls
+        self.upstream = upstream
+        self.images = images
+        self.tiles = tiles
+        self.workers = workers
+        self.rate = rate
+        self.per = per
+        self.stats = ArchiveStats()
+        self.logger = logging.getLogger("fishie")
+        # keys queued or archived recently, failed ones are removed again
+        self.seen: ExpiringCache = ExpiringCache(3600.0, maxsize=100_000)
+        self._queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=max_queue)
+        self._buckets: List[WebhookBucket] = []
+        self._tasks: List[asyncio.Task[None]] = []
+        self._lock = asyncio.Lock()
+
+    def __repr__(self) -> str:
+        return f"<ImageArchiver workers={self.workers} backlog={self.backlog}>"
+
+    @property
+    def backlog(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+
+        session = self.upstream.session
+        self._buckets = [
+            WebhookBucket(
+                discord.Webhook.from_url(url, session=session), self.rate, self.per
+            )
+            for url in self.urls
+        ]
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def put(self, job: ArchiveJob) -> bool:
+        """Queues a job without waiting, returns whether it was queued."""
+        if job.key in self.seen:
+            self.stats.duplicates += 1
+            return False
+
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.stats.dropped += 1
+            return False
+
+        self.seen[job.key] = True
+        self.stats.queued += 1
+        return True
+
+    async def close(self, timeout: float = 30.0) -> None:
+        """Lets the workers finish what is queued, cancelling them after `timeout`."""
+        if not self._tasks:
+            return
+
+        for _ in self._tasks:
+            # the queue may be full, the workers are draining it
+            await self._queue.put(_STOP)
+
+        done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+
+    async def _acquire(self) -> WebhookBucket:
+        # one worker at a time picks a webhook so two can't take the same slot
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                bucket = min(self._buckets, key=lambda b: b.available_at(now))
+                delay = bucket.available_at(now) - now
+                if delay <= 0:
+                    bucket.hit(now)
+                    return bucket
+
+                await asyncio.sleep(delay)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            if job is _STOP:
+                return
+
+            try:
+                await self._archive(job)
+            except Exception as e:
+                self.stats.failed += 1
+                self.seen.pop(job.key, None)
+                self.logger.warning(
+                    f"Could not archive {job.filename}: {e.__class__.__name__}: {e}"
+                )
+
+    async def _archive(self, job: ArchiveJob) -> None:
+        if not self._buckets:
+            raise RuntimeError("No image webhooks are configured")
+
+        data = await job.asset.read()
+        image = await self.images.resize_to_limit(data, UPLOAD_LIMIT)
+
+        waited = time.perf_counter()
+        bucket = await self._acquire()
+        start = time.perf_counter()
+
+        try:
+            message = await bucket.webhook.send(
+                job.content,
+                file=discord.File(image, filename=job.filename),
+                wait=True,
+                allowed_mentions=discord.AllowedMentions.none(),
+            )
+        except discord.HTTPException as e:
+            if e.status == 429:
+                # another process shares the webhook, back off from it for a while
+                bucket.blocked_until = time.monotonic() + self.per
+            raise
+
+        upload = time.perf_counter() - start
+        self.stats.archived += 1
+        self.stats.last_upload = upload
+        self.stats.total_upload += upload
+        self.stats.max_upload = max(self.stats.max_upload, upload)
+        self.stats.total_wait += start - waited
+
+        try:
+            await self.pool.execute(job.sql, *job.args, message.attachments[0].url)
+        except asyncpg.UniqueViolationError:
+            pass
+
+        if job.tile is not None:
+            await self._cache_tile(job, data)
+
+    async def _cache_tile(self, job: ArchiveJob, data: bytes) -> None:
+        # the asset is archived either way, the grid can download it later
+        try:
+            thumbnail = await self.images.thumbnail(data)
+            await self.tiles.put(job.tile, thumbnail)  # type: ignore
+        except Exception as e:
+            self.logger.warning(
+                f"Could not cache the tile of {job.filename}: {e.__class__.__name__}: {e}"
+            )
@@ -0,0 +1,488 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Dict,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+import asyncpg
+
+__all__ = (
+    "TRANSIENT_ERRORS",
+    "CopyTarget",
+    "BatchStats",
+    "BatchWriter",
+    "UsernameLog",
+    "DisplayNameLog",
+    "NicknameLog",
+    "StatusLog",
+    "MemberJoinLog",
+    "GuildNameLog",
+    "GuildJoinLog",
+    "CommandLog",
+    "LOG_TABLES",
+    "Ingestor",
+)
+
+_STOP = object()
+# returned by `_get` when nothing arrived in time
+_EMPTY = object()
+
+TRANSIENT_ERRORS = (
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+    OSError,
+    asyncio.TimeoutError,
+)
+
+
+class CopyTarget(Protocol):
+    async def copy_records_to_table(
+        self, table_name: str, *, records: Any, columns: Any = None
+    ) -> Any: ...
+
+
+@dataclass()
+class BatchStats:
+    rows: int = 0
+    flushes: int = 0
+    failures: int = 0
+    last_latency: float = 0.0
+    max_latency: float = 0.0
+    total_latency: float = 0.0
+
+    @property
+    def average_latency(self) -> float:
+        return self.total_latency / self.flushes if self.flushes else 0.0
+
+
+class BatchWriter:
+    """Write-behind buffer that COPYs rows into a table in batches.
+
+    Rows are flushed when `max_rows` have been collected or `flush_interval`
+    seconds have passed since the first row of the batch, whichever is first.
+    `put` waits once `max_size` rows are queued so producers get backpressure
+    instead of unbounded memory growth.
+    """
+
+    def __init__(
+        self,
+        target: CopyTarget,
+        table: str,
+        columns: Sequence[str],
+        *,
+        max_rows: int = 500,
+        flush_interval: float = 2.0,
+        max_size: int = 10_000,
+    ) -> None:
+        self.target = target
+        self.table = table
+        self.columns: Tuple[str, ...] = tuple(columns)
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.stats = BatchStats()
+        self.logger = logging.getLogger("fishie")
+        self._queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=max_size)
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def __repr__(self) -> str:
+        return f"<BatchWriter table={self.table!r} depth={self.depth}>"
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._runner())
+
+    async def put(self, *row: Any) -> None:
+        if len(row) != len(self.columns):
+            raise ValueError(
+                f"Expected {len(self.columns)} values for {self.table}, got {len(row)}"
+            )
+
+        await self._queue.put(row)
+
+    async def close(self) -> None:
+        """Flushes everything still queued and stops the writer."""
+        if not self.running:
+            return
+
+        await self._queue.put(_STOP)
+        await self._task  # type: ignore
+
+    async def _runner(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+
+            batch: List[Tuple[Any, ...]] = [item]
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+
+            while len(batch) < self.max_rows:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+
+                    item = await self._get(remaining)
+                    if item is _EMPTY:
+                        break
+
+                if item is _STOP:
+                    stopping = True
+                    break
+
+                batch.append(item)
+
+            await self._write(batch)
+
+            if stopping:
+                return
+
+    async def _get(self, timeout: float) -> Any:
+        # wait_for can cancel the get after it has taken an item off the queue,
+        # losing it, so wait without cancelling and collect a late result
+        getter = asyncio.ensure_future(self._queue.get())
+        try:
+            await asyncio.wait((getter,), timeout=timeout)
+            if not getter.done():
+                getter.cancel()
+                await asyncio.wait((getter,))
+        except BaseException:
+            getter.cancel()
+            raise
+
+        return _EMPTY if getter.cancelled() else getter.result()
+
+    async def _write(self, batch: List[Tuple[Any, ...]]) -> None:
+        start = time.perf_counter()
+        try:
+            await self.target.copy_records_to_table(
+                self.table, records=batch, columns=self.columns
+            )
+        except Exception as e:
+            self.stats.failures += 1
+            self.logger.error(
+                f"Failed to write {len(batch)} rows to {self.table}: {e.__class__.__name__}: {e}"
+            )
+            return
+
+        latency = time.perf_counter() - start
+        self.stats.rows += len(batch)
+        self.stats.flushes += 1
+        self.stats.last_latency = latency
+        self.stats.total_latency += latency
+        self.stats.max_latency = max(self.stats.max_latency, latency)
+
+
+# typed records for the history logging tables, field names are the column names
+
+
+class UsernameLog(NamedTuple):
+    user_id: int
+    username: str
+    created_at: datetime.datetime
+
+
+class DisplayNameLog(NamedTuple):
+    user_id: int
+    display_name: str
+    created_at: datetime.datetime
+
+
+class NicknameLog(NamedTuple):
+    user_id: int
+    guild_id: int
+    nickname: Optional[str]
+    created_at: datetime.datetime
+
+
+class StatusLog(NamedTuple):
+    user_id: int
+    status_name: str
+    guild_id: int
+    created_at: datetime.datetime
+
+
+class MemberJoinLog(NamedTuple):
+    member_id: int
+    guild_id: int
+    time: datetime.datetime
+
+
+class GuildNameLog(NamedTuple):
+    guild_id: int
+    name: str
+    created_at: datetime.datetime
+
+
+class GuildJoinLog(NamedTuple):
+    guild_id: int
+    owner_id: Optional[int]
+    time: datetime.datetime
+
+
+class CommandLog(NamedTuple):
+    user_id: int
+    guild_id: Optional[int]
+    channel_id: int
+    message_id: int
+    command: str
+    created_at: datetime.datetime
+
+
+LOG_TABLES: Dict[Type[Any], str] = {
+    UsernameLog: "username_logs",
+    DisplayNameLog: "display_name_logs",
+    NicknameLog: "nickname_logs",
+    StatusLog: "status_logs",
+    MemberJoinLog: "member_join_logs",
+    GuildNameLog: "guild_name_logs",
+    GuildJoinLog: "guild_join_logs",
+    CommandLog: "command_logs",
+}
+
+
+def _encode_journal(o: Any) -> Any:
+    if isinstance(o, datetime.datetime):
+        return {"$datetime": o.isoformat()}
+
+    raise TypeError(f"Cannot journal {o.__class__.__name__}")
+
+
+def _decode_journal(o: Dict[str, Any]) -> Any:
+    if "$datetime" in o:
+        return datetime.datetime.fromisoformat(o["$datetime"])
+
+    return o
+
+
+class Ingestor:
+    """Funnels typed log records into per-table `BatchWriter`s.
+
+    Every writer flushes through one dedicated connection. Transient
+    connection errors are retried with a backoff, and batches that still
+    can't be written are appended to a journal on disk that gets replayed
+    once the database is reachable again.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        tables: Mapping[Type[Any], str] = LOG_TABLES,
+        *,
+        journal: str = "files/journal/ingest.jsonl",
+        retries: int = 3,
+        max_rows: int = 500,
+        flush_interval: float = 2.0,
+        max_size: int = 10_000,
+    ) -> None:
+        self.dsn = dsn
+        self.journal = journal
+        self.retries = retries
+        self.logger = logging.getLogger("fishie")
+        self.spilled: int = 0
+        self.replayed: int = 0
+        self.writers: Dict[Type[Any], BatchWriter] = {
+            record: BatchWriter(
+                self,
+                table,
+                record._fields,
+                max_rows=max_rows,
+                flush_interval=flush_interval,
+                max_size=max_size,
+            )
+            for record, table in tables.items()
+        }
+        self._connection: Optional["asyncpg.Connection[asyncpg.Record]"] = None
+        self._lock = asyncio.Lock()
+
+    def __repr__(self) -> str:
+        return f"<Ingestor tables={len(self.writers)} depth={self.depth}>"
+
+    @property
+    def depth(self) -> int:
+        return sum(w.depth for w in self.writers.values())
+
+    async def start(self) -> None:
+        async with self._lock:
+            try:
+                await self._replay()
+            except Exception as e:
+                # the journal is kept, the next successful write replays it
+                self.logger.warning(
+                    f"Could not replay ingest journal: {e.__class__.__name__}: {e}"
+                )
+
+        for writer in self.writers.values():
+            writer.start()
+
+    async def put(self, record: NamedTuple) -> None:
+        try:
+            writer = self.writers[type(record)]
+        except KeyError:
+            raise TypeError(f"No table registered for {record.__class__.__name__}")
+
+        await writer.put(*record)
+
+    async def close(self) -> None:
+        await asyncio.gather(*(w.close() for w in self.writers.values()))
+
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+    async def _connect(self) -> "asyncpg.Connection[asyncpg.Record]":
+        if self._connection is None or self._connection.is_closed():
+            self._connection = await asyncpg.connect(self.dsn)
+
+        return self._connection
+
+    async def _drop_connection(self) -> None:
+        if self._connection is None:
+            return
+
+        try:
+            await self._connection.close(timeout=5)
+        except Exception:
+            self._connection.terminate()
+
+        self._connection = None
+
+    async def _copy(
+        self, table: str, columns: Sequence[str], records: List[Tuple[Any, ...]]
+    ) -> None:
+        connection = await self._connect()
+        await connection.copy_records_to_table(table, records=records, columns=columns)
+
+    async def copy_records_to_table(
+        self, table_name: str, *, records: Any, columns: Any = None
+    ) -> None:
+        async with self._lock:
+            for attempt in range(self.retries):
+                try:
+                    await self._copy(table_name, columns, records)
+                except TRANSIENT_ERRORS as e:
+                    self.logger.warning(
+                        f"Ingest write to {table_name} failed (attempt {attempt + 1}/{self.retries}): {e.__class__.__name__}: {e}"
+                    )
+                    await self._drop_connection()
+                    await asyncio.sleep(0.5 * 2**attempt)
+                    continue
+
+                # this batch is written, a failing replay must not fail it too
+                try:
+                    await self._replay()
+                except TRANSIENT_ERRORS:
+                    await self._drop_connection()
+                except Exception as e:
+                    self.logger.error(
+                        f"Could not replay ingest journal: {e.__class__.__name__}: {e}"
+                    )
+
+                return
+
+            await self._spill(table_name, columns, records)
+
+    def _append_journal(self, line: str) -> None:
+        os.makedirs(os.path.dirname(self.journal), exist_ok=True)
+        with open(self.journal, "a", encoding="utf-8") as fp:
+            fp.write(line)
+
+    async def _spill(
+        self, table: str, columns: Sequence[str], records: List[Tuple[Any, ...]]
+    ) -> None:
+        line = json.dumps(
+            {"table": table, "columns": list(columns), "rows": records},
+            default=_encode_journal,
+        )
+        await asyncio.to_thread(self._append_journal, line + "\n")
+        self.spilled += len(records)
+        self.logger.warning(f"Journaled {len(records)} rows for {table}")
+
+    def _read_journal(self) -> List[str]:
+        try:
+            with open(self.journal, encoding="utf-8") as fp:
+                return [line for line in fp if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _rewrite_journal(self, lines: List[str]) -> None:
+        if not lines:
+            try:
+                os.remove(self.journal)
+            except FileNotFoundError:
+                pass
+            return
+
+        with open(f"{self.journal}.tmp", "w", encoding="utf-8") as fp:
+            fp.writelines(lines)
+        os.replace(f"{self.journal}.tmp", self.journal)
+
+    async def _replay(self) -> None:
+        # the lock is held by the caller, nothing else appends while this runs
+        if not os.path.exists(self.journal):
+            return
+
+        lines = await asyncio.to_thread(self._read_journal)
+        index = 0
+
+        try:
+            for index, line in enumerate(lines):
+                try:
+                    entry = json.loads(line, object_hook=_decode_journal)
+                    table, columns = entry["table"], entry["columns"]
+                    rows = [tuple(r) for r in entry["rows"]]
+                except (ValueError, KeyError, TypeError) as e:
+                    # a line cut short by a crash while it was appended
+                    self.logger.error(
+                        f"Dropped unreadable journal line: {e.__class__.__name__}: {e}"
+                    )
+                    continue
+
+                try:
+                    await self._copy(table, columns, rows)
+                except TRANSIENT_ERRORS:
+                    raise
+                except Exception as e:
+                    # not going to succeed on a later attempt either
+                    self.logger.error(
+                        f"Dropped journaled batch for {table}: {e.__class__.__name__}: {e}"
+                    )
+                    continue
+
+                self.replayed += len(rows)
+            else:
+                index = len(lines)
+        finally:
+            # only what wasn't written yet stays, so nothing is copied twice
+            await asyncio.to_thread(self._rewrite_journal, lines[index:])
+
+        self.logger.info(f"Replayed {len(lines)} journaled batches")
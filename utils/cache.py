@@ -2,54 +2,163 @@ from __future__ import annotations
 
 import asyncio
 import enum
+import heapq
+import itertools
 import time
+from collections import OrderedDict
 from functools import wraps
-from typing import Any, Callable, Coroutine, MutableMapping, Protocol, TypeVar
+from typing import (
+    Any,
+    Callable,
+    Coroutine,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Protocol,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
 from lru import LRU
 
 R = TypeVar("R")
 
+_KWARGS = object()
+
+# how an argument is put in a cache key, decided once per type
+_VALUE = 0
+_CLASS = 1
+_REPR = 2
+_key_modes: Dict[type, int] = {}
+
+
+def _key_part(o: Any) -> Any:
+    cls = o.__class__
+    try:
+        mode = _key_modes[cls]
+    except KeyError:
+        if cls.__repr__ is object.__repr__:
+            # we do not care which instance 'self' is, only what it is
+            mode = _CLASS
+        elif cls.__hash__ is None:
+            mode = _REPR
+        else:
+            mode = _VALUE
+        _key_modes[cls] = mode
+
+    if mode == _VALUE:
+        try:
+            hash(o)
+        except TypeError:
+            # a hashable type holding something that isn't, like (1, [2])
+            return repr(o)
+        return o
+    if mode == _CLASS:
+        return cls
+    return repr(o)
+
 
 # Can't use ParamSpec due to https://github.com/python/typing/discussions/946
 class CacheProtocol(Protocol[R]):
-    cache: MutableMapping[str, asyncio.Task[R]]
+    cache: MutableMapping[Any, asyncio.Task[R]]
 
     def __call__(self, *args: Any, **kwds: Any) -> asyncio.Task[R]: ...
 
-    def get_key(self, *args: Any, **kwargs: Any) -> str: ...
+    def get_key(self, *args: Any, **kwargs: Any) -> Any: ...
 
     def invalidate(self, *args: Any, **kwargs: Any) -> bool: ...
 
-    def invalidate_containing(self, key: str) -> None: ...
+    def invalidate_containing(self, key: Any) -> None: ...
 
-    def get_stats(self) -> tuple[int, int]: ...
+    def get_stats(self) -> tuple[int, ...]: ...
 
 
-class ExpiringCache(dict):
-    def __init__(self, seconds: float):
+class ExpiringCache(MutableMapping[Any, Any]):
+    """Mapping whose entries expire `seconds` after they were set.
+
+    Deadlines are kept in a min-heap so expiring is O(log n) per expired
+    entry instead of a scan of the whole cache on every lookup. With a
+    `maxsize` the least recently used entry is evicted once it is full.
+    """
+
+    def __init__(self, seconds: float, maxsize: Optional[int] = None):
         self.__ttl: float = seconds
-        super().__init__()
+        self.maxsize: Optional[int] = maxsize
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.on_evict: Optional[Callable[[Any, Any], None]] = None
+        self._data: OrderedDict[Any, Tuple[Any, float]] = OrderedDict()
+        self._deadlines: List[Tuple[float, int, Any]] = []
+        self._counter = itertools.count()
+
+    def __expire(self):
+        now = time.monotonic()
+        heap = self._deadlines
+
+        while heap and heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(heap)
+            entry = self._data.get(key)
+            # stale heap entries for overwritten or deleted keys are skipped
+            if entry is not None and entry[1] == deadline:
+                del self._data[key]
+                self.evictions += 1
+                if self.on_evict is not None:
+                    self.on_evict(key, entry[0])
+
+        if len(heap) > 2 * len(self._data) + 64:
+            self._deadlines = [
+                (deadline, next(self._counter), key)
+                for key, (_, deadline) in self._data.items()
+            ]
+            heapq.heapify(self._deadlines)
 
-    def __verify_cache_integrity(self):
-        # Have to do this in two steps...
-        current_time = time.monotonic()
-        to_remove = [
-            k for (k, (v, t)) in self.items() if current_time > (t + self.__ttl)
-        ]
-        for k in to_remove:
-            del self[k]
+    def __contains__(self, key: object):
+        self.__expire()
+        return key in self._data
 
-    def __contains__(self, key: str):
-        self.__verify_cache_integrity()
-        return super().__contains__(key)
+    def __getitem__(self, key: Any):
+        self.__expire()
+        try:
+            value, _ = self._data[key]
+        except KeyError:
+            self.misses += 1
+            raise
 
-    def __getitem__(self, key: str):
-        self.__verify_cache_integrity()
-        return super().__getitem__(key)
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
 
-    def __setitem__(self, key: str, value: Any):
-        super().__setitem__(key, (value, time.monotonic()))
+    def __setitem__(self, key: Any, value: Any):
+        self.__expire()
+        deadline = time.monotonic() + self.__ttl
+        self._data[key] = (value, deadline)
+        self._data.move_to_end(key)
+        heapq.heappush(self._deadlines, (deadline, next(self._counter), key))
+
+        if self.maxsize is not None and len(self._data) > self.maxsize:
+            old_key, (old_value, _) = self._data.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(old_key, old_value)
+
+    def __delitem__(self, key: Any):
+        del self._data[key]
+
+    def __iter__(self) -> Iterator[Any]:
+        self.__expire()
+        return iter(list(self._data))
+
+    def __len__(self) -> int:
+        self.__expire()
+        return len(self._data)
+
+    def get_stats(self) -> Tuple[int, int, int]:
+        return self.hits, self.misses, self.evictions
 
 
 class Strategy(enum.Enum):
@@ -62,7 +171,15 @@ def cache(
     maxsize: int = 128,
     strategy: Strategy = Strategy.lru,
     ignore_kwargs: bool = False,
+    ttl: Optional[float] = None,
+    key: Optional[Callable[..., Hashable]] = None,
 ) -> Callable[[Callable[..., Coroutine[Any, Any, R]]], CacheProtocol[R]]:
+    # Strategy.timed used to take the TTL in seconds through `maxsize` and had no
+    # size limit, that still works when `ttl` isn't passed.
+    # `key` is called with the same arguments as the function and replaces the
+    # default key, return a tuple to have its items indexed for invalidate_containing.
+    _key_func = key
+
     def decorator(func: Callable[..., Coroutine[Any, Any, R]]) -> CacheProtocol[R]:
         if strategy is Strategy.lru:
             _internal_cache = LRU(maxsize)
@@ -71,32 +188,71 @@ def cache(
             _internal_cache = {}
             _stats = lambda: (0, 0)
         elif strategy is Strategy.timed:
-            _internal_cache = ExpiringCache(maxsize)
-            _stats = lambda: (0, 0)
+            if ttl is None:
+                _internal_cache = ExpiringCache(maxsize)
+            else:
+                _internal_cache = ExpiringCache(ttl, maxsize=maxsize)
+            _stats = _internal_cache.get_stats
 
-        def _make_key(args: tuple[Any, ...], kwargs: dict[str, Any]) -> str:
-            # this is a bit of a cluster fuck
-            # we do care what 'self' parameter is when we __repr__ it
-            def _true_repr(o):
-                if o.__class__.__repr__ is object.__repr__:
-                    return f"<{o.__class__.__module__}.{o.__class__.__name__}>"
-                return repr(o)
-
-            key = [f"{func.__module__}.{func.__name__}"]
-            key.extend(_true_repr(o) for o in args)
-            if not ignore_kwargs:
-                for k, v in kwargs.items():
-                    # note: this only really works for this use case in particular
-                    # I want to pass asyncpg.Connection objects to the parameters
-                    # however, they use default __repr__ and I do not care what
-                    # connection is passed in, so I needed a bypass.
-                    if k == "connection" or k == "pool":
-                        continue
-
-                    key.append(_true_repr(k))
-                    key.append(_true_repr(v))
-
-            return ":".join(key)
+        # argument part -> every key containing it, lets invalidate_containing
+        # find the entries for e.g. a user ID without scanning the whole cache
+        _index: Dict[Any, Set[Any]] = {}
+
+        def _make_key(args: tuple[Any, ...], kwargs: dict[str, Any]) -> Any:
+            if _key_func is not None:
+                return _key_func(*args, **kwargs)
+
+            key = tuple(map(_key_part, args))
+            if not kwargs or ignore_kwargs:
+                return key
+
+            extra = [_KWARGS]
+            for k, v in kwargs.items():
+                # note: this only really works for this use case in particular
+                # I want to pass asyncpg.Connection objects to the parameters
+                # however, I do not care what connection is passed in,
+                # so I needed a bypass.
+                if k == "connection" or k == "pool":
+                    continue
+
+                extra.append(k)
+                extra.append(_key_part(v))
+
+            return key + tuple(extra) if len(extra) > 1 else key
+
+        def _parts(key: Any) -> Iterator[Any]:
+            if not isinstance(key, tuple):
+                yield key
+                return
+
+            kwargs = False
+            for index, part in enumerate(key):
+                if part is _KWARGS:
+                    kwargs = True
+                    continue
+                # skip keyword names, only their values are worth indexing
+                if kwargs and (len(key) - index) % 2 == 0:
+                    continue
+                yield part
+
+        def _index_key(key: Any) -> None:
+            for part in _parts(key):
+                _index.setdefault(part, set()).add(key)
+
+        def _unindex_key(key: Any, *_: Any) -> None:
+            for part in _parts(key):
+                keys = _index.get(part)
+                if keys is None:
+                    continue
+
+                keys.discard(key)
+                if not keys:
+                    del _index[part]
+
+        if strategy is Strategy.lru:
+            _internal_cache.set_callback(_unindex_key)
+        elif strategy is Strategy.timed:
+            _internal_cache.on_evict = _unindex_key
 
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any):
@@ -105,24 +261,25 @@ def cache(
                 task = _internal_cache[key]
             except KeyError:
                 _internal_cache[key] = task = asyncio.create_task(func(*args, **kwargs))
+                _index_key(key)
                 return task
             else:
                 return task
 
         def _invalidate(*args: Any, **kwargs: Any) -> bool:
+            key = _make_key(args, kwargs)
+            _unindex_key(key)
             try:
-                del _internal_cache[_make_key(args, kwargs)]
+                del _internal_cache[key]
             except KeyError:
                 return False
             else:
                 return True
 
-        def _invalidate_containing(key: str) -> None:
-            to_remove = []
-            for k in _internal_cache.keys():
-                if key in k:
-                    to_remove.append(k)
-            for k in to_remove:
+        def _invalidate_containing(key: Any) -> None:
+            """Drops every entry that has `key` as one of its arguments."""
+            for k in _index.pop(key, set()):
+                _unindex_key(k)
                 try:
                     del _internal_cache[k]
                 except KeyError:
@@ -10,7 +10,6 @@ from discord.ext import commands
 
 from .functions import response_checker, to_thread
 from .regexes import TENOR_PAGE_RE
-from .vars import base_header
 
 if TYPE_CHECKING:
     from extensions.context import Context
@@ -58,11 +57,19 @@ class SpotifyConverter:
 
         api_data = {"q": query, "type": self.mode, "limit": "10", "market": "US"}
 
-        async with ctx.session.get(url, headers=headers, params=api_data) as resp:
-            response_checker(resp)
-            data: Optional[Dict[Any, Any]] = (
-                (await resp.json()).get(self.format_mode[self.mode]).get(f"items")
-            )
+        async def fetch() -> Dict[Any, Any]:
+            async with ctx.bot.upstreams["spotify"].get(
+                url, headers=headers, params=api_data
+            ) as resp:
+                response_checker(resp)
+                return await resp.json()
+
+        results = await ctx.bot.responses.get_or_fetch(
+            "spotify", query, fetch, self.mode
+        )
+        data: Optional[Dict[Any, Any]] = results.get(self.format_mode[self.mode]).get(
+            f"items"
+        )
 
         if data == [] or data is None:
             raise commands.BadArgument("No info found for this query")
@@ -154,7 +161,7 @@ class TenorUrlConverter(commands.Converter):
         if not TUrl:
             raise commands.BadArgument("Invalid Tenor URL.")
 
-        async with ctx.session.get(TUrl.group(0), headers=base_header) as r:
+        async with ctx.bot.upstreams["tenor"].get(TUrl.group(0)) as r:
             text = await r.text()
 
         url = await self.get_url(text)
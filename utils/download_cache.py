@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import shutil
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+__all__ = (
+    "TRACKING_PARAMS",
+    "HOST_ALIASES",
+    "normalize_url",
+    "CachedDownload",
+    "DownloadCache",
+)
+
+# query parameters that only track where a link was shared from
+TRACKING_PARAMS = frozenset(
+    {
+        "feature",
+        "fbclid",
+        "igsh",
+        "igshid",
+        "is_from_webapp",
+        "pp",
+        "ref",
+        "ref_src",
+        "s",
+        "sender_device",
+        "share_id",
+        "si",
+        "t",
+        "_r",
+        "_t",
+    }
+)
+
+HOST_ALIASES: Dict[str, str] = {
+    "x.com": "twitter.com",
+    "mobile.twitter.com": "twitter.com",
+    "m.youtube.com": "youtube.com",
+    "music.youtube.com": "youtube.com",
+    "old.reddit.com": "reddit.com",
+    "new.reddit.com": "reddit.com",
+}
+
+
+def normalize_url(url: str) -> str:
+    """Strips the parts of a URL that don't change what gets downloaded.
+
+    The scheme, `www.`, tracking parameters, fragments and trailing slashes
+    are dropped and a few hosts that serve the same content are merged.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    host = HOST_ALIASES.get(host, host)
+    path = parts.path.rstrip("/") or "/"
+
+    if host == "youtu.be":
+        host, query = "youtube.com", [("v", path.lstrip("/"))]
+        path = "/watch"
+    else:
+        query = [
+            (k, v)
+            for k, v in parse_qsl(parts.query)
+            if k not in TRACKING_PARAMS and not k.startswith("utm_")
+        ]
+
+    return urlunsplit(("https", host, path, urlencode(sorted(query)), ""))
+
+
+def _attachment_expiry(url: str) -> float:
+    # signed CDN links carry their expiry as a hex timestamp in `ex`
+    for key, value in parse_qsl(urlsplit(url).query):
+        if key == "ex":
+            try:
+                return float(int(value, 16))
+            except ValueError:
+                break
+
+    return time.time() + 86400
+
+
+@dataclass()
+class CachedDownload:
+    key: str
+    # (path on disk, filename to upload it as)
+    files: List[Tuple[str, str]]
+    size: int
+    urls: List[str] = field(default_factory=list)
+    urls_expire: float = 0.0
+    hits: int = 0
+
+    def fresh_urls(self) -> Optional[List[str]]:
+        """The URLs of the first upload, if they will still work for a while."""
+        if self.urls and time.time() < self.urls_expire - 3600:
+            return self.urls
+
+        return None
+
+
+def _move_into(
+    directory: str, files: List[Tuple[str, str]]
+) -> Tuple[List[Tuple[str, str]], int]:
+    os.makedirs(directory, exist_ok=True)
+    moved: List[Tuple[str, str]] = []
+    size = 0
+
+    for index, (path, filename) in enumerate(files):
+        target = os.path.join(directory, f"{index}{os.path.splitext(path)[1]}")
+        os.replace(path, target)
+        size += os.path.getsize(target)
+        moved.append((target, filename))
+
+    return moved, size
+
+
+class DownloadCache:
+    """Keeps finished downloads on disk so repeated links aren't downloaded again.
+
+    Entries are keyed by a hash of the normalized URL and anything else that
+    changes the output (like the format). They are evicted least recently
+    used first once `max_bytes` or `max_entries` is passed. Concurrent
+    requests for a key that is still downloading wait on that download
+    instead of starting their own.
+    """
+
+    def __init__(
+        self,
+        root: str = "files/downloads/cache",
+        *,
+        max_bytes: int = 2_000_000_000,
+        max_entries: int = 500,
+    ) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.coalesced: int = 0
+        self.evictions: int = 0
+        self.entries: OrderedDict[str, CachedDownload] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future[CachedDownload]] = {}
+
+    def __repr__(self) -> str:
+        return f"<DownloadCache entries={len(self.entries)} size={self.size}>"
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def key(url: str, *options: object) -> str:
+        raw = "|".join([normalize_url(url), *map(str, options)])
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    def get(self, key: str) -> Optional[CachedDownload]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            entry.hits += 1
+            self.hits += 1
+
+        return entry
+
+    async def _wait_inflight(self, key: str) -> Optional[CachedDownload]:
+        future = self._inflight.get(key)
+        if future is None:
+            return None
+
+        self.coalesced += 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+
+            # the download we were waiting on was cancelled, not us
+            return None
+
+    async def peek(self, key: str) -> Optional[CachedDownload]:
+        """Returns a cached entry or waits for one that is downloading, never fetches."""
+        return self.get(key) or await self._wait_inflight(key)
+
+    async def get_or_fetch(
+        self, key: str, fetch: Callable[[], Awaitable[List[Tuple[str, str]]]]
+    ) -> CachedDownload:
+        """Returns the cached entry for `key`, running `fetch` to create it if needed.
+
+        `fetch` returns (path, filename) pairs, the files are moved into the
+        cache directory so the caller must not remove them afterwards."""
+        while True:
+            entry = await self.peek(key)
+            if entry is not None:
+                return entry
+
+            if key not in self._inflight:
+                break
+
+        self.misses += 1
+        future: asyncio.Future[CachedDownload] = (
+            asyncio.get_running_loop().create_future()
+        )
+        # nothing might be waiting on it, don't warn about unretrieved errors
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+
+        try:
+            entry = await self._store(key, await fetch())
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(entry)
+            return entry
+        finally:
+            del self._inflight[key]
+
+    def remember(self, entry: CachedDownload, urls: List[str], expires: float) -> None:
+        entry.urls = urls
+        entry.urls_expire = expires
+
+    def remember_attachments(self, entry: CachedDownload, urls: List[str]) -> None:
+        if urls:
+            self.remember(entry, urls, min(map(_attachment_expiry, urls)))
+
+    async def discard(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+            await asyncio.to_thread(
+                shutil.rmtree, os.path.join(self.root, key), ignore_errors=True
+            )
+
+    async def clear(self) -> None:
+        """Drops every entry, including files left over from a previous run."""
+        self.entries.clear()
+        self.size = 0
+        await asyncio.to_thread(shutil.rmtree, self.root, ignore_errors=True)
+
+    async def _store(self, key: str, files: List[Tuple[str, str]]) -> CachedDownload:
+        moved, size = await asyncio.to_thread(
+            _move_into, os.path.join(self.root, key), files
+        )
+        entry = CachedDownload(key, moved, size)
+        self.entries[key] = entry
+        self.size += size
+
+        # the new entry is kept even if it is bigger than max_bytes on its own
+        while len(self.entries) > 1 and (
+            self.size > self.max_bytes or len(self.entries) > self.max_entries
+        ):
+            oldest = next(iter(self.entries))
+            self.evictions += 1
+            await self.discard(oldest)
+
+        return entry
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import secrets
+import time
+from typing import FrozenSet, Iterable, List, Set, Tuple
+
+__all__ = (
+    "SWEEP_SUFFIXES",
+    "DownloadFiles",
+)
+
+# anything else in the directory (like blank.txt) is left alone
+SWEEP_SUFFIXES = (
+    ".mp4",
+    ".webm",
+    ".mov",
+    ".mp3",
+    ".gif",
+    ".ogg",
+    ".wav",
+    ".m4a",
+    ".part",
+    ".ytdl",
+)
+
+
+def _job_name(filename: str) -> str:
+    # yt-dlp adds its own suffixes, e.g. "<name>.f137.mp4" or "<name>.mp4.part"
+    return filename.split(".", 1)[0]
+
+
+class DownloadFiles:
+    """Keeps track of the files downloads leave in `files/downloads`.
+
+    Each download reserves its base paths through `reserve` and hands them
+    back to `release` once it is done, which removes whatever is still there
+    (the finished files have been moved into the cache by then). `sweep`
+    catches what is left behind anyway, removing files older than `max_age`
+    and then the oldest ones until the directory is under `max_bytes`.
+    Reserved names are never swept. All disk access runs off the event loop.
+    """
+
+    def __init__(
+        self,
+        root: str = "files/downloads",
+        *,
+        max_age: float = 3600.0,
+        max_bytes: int = 1_000_000_000,
+    ) -> None:
+        self.root = root
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.removed: int = 0
+        self.freed: int = 0
+        self.active: Set[str] = set()
+
+    def __repr__(self) -> str:
+        return f"<DownloadFiles root={self.root!r} active={len(self.active)}>"
+
+    def reserve(self) -> str:
+        """Returns a unique base path for a download, without an extension."""
+        name = secrets.token_urlsafe(8)
+        self.active.add(name)
+        return os.path.join(self.root, name)
+
+    async def release(self, paths: Iterable[str]) -> None:
+        """Removes every file created under these reserved paths."""
+        names = {os.path.basename(path) for path in paths}
+        if not names:
+            return
+
+        removed, freed = await asyncio.to_thread(self._remove_names, names)
+        self.active.difference_update(names)
+        self.removed += removed
+        self.freed += freed
+
+    async def sweep(self) -> Tuple[int, int]:
+        """Removes stale files, returns how many were removed and their total size."""
+        removed, freed = await asyncio.to_thread(
+            self._sweep, frozenset(self.active), time.time()
+        )
+        self.removed += removed
+        self.freed += freed
+        return removed, freed
+
+    async def usage(self) -> Tuple[int, int]:
+        """Returns the number of files under `root`, cache included, and their size."""
+        return await asyncio.to_thread(self._usage)
+
+    def _scan(self) -> List[os.DirEntry[str]]:
+        try:
+            with os.scandir(self.root) as it:
+                return [
+                    e
+                    for e in it
+                    if e.is_file(follow_symlinks=False)
+                    and e.name.endswith(SWEEP_SUFFIXES)
+                ]
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _unlink(path: str) -> int:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+
+        return size
+
+    def _remove_names(self, names: Set[str]) -> Tuple[int, int]:
+        removed = freed = 0
+        for entry in self._scan():
+            if _job_name(entry.name) in names:
+                removed += 1
+                freed += self._unlink(entry.path)
+
+        return removed, freed
+
+    def _sweep(self, active: FrozenSet[str], now: float) -> Tuple[int, int]:
+        files: List[Tuple[float, int, str]] = []
+        for entry in self._scan():
+            if _job_name(entry.name) in active:
+                continue
+
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        removed = freed = 0
+
+        for mtime, size, path in files:
+            if now - mtime < self.max_age and total <= self.max_bytes:
+                break
+
+            freed += self._unlink(path)
+            total -= size
+            removed += 1
+
+        return removed, freed
+
+    def _usage(self) -> Tuple[int, int]:
+        count = size = 0
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                try:
+                    size += os.path.getsize(os.path.join(directory, filename))
+                except FileNotFoundError:
+                    continue
+                count += 1
+
+        return count, size
@@ -1,48 +1,81 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 import secrets
-from typing import TYPE_CHECKING, Any, Dict, List, Optional
+import time
+from typing import IO, TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
+import aiohttp
 import discord
-import yt_dlp
 from discord.ext import commands
-from .errors import DownloadError, InvalidWebsite, VideoIsLive
-from .functions import to_thread, run, litterbox, capitalize_text
-from .regexes import (
-    SOUNDCLOUD_RE,
-    TIKTOK_RE,
-    TWITTER_RE,
-    VIDEOS_RE,
-    INSTAGRAM_RE,
-    YOUTUBE_RE,
-    YT_SHORT_RE,
-    YT_CLIP_RE,
-    REDDIT_RE,
-)
+from .download_cache import CachedDownload, DownloadCache
+from .errors import DownloadError, FileTooLarge, InvalidWebsite
+from .functions import to_thread, litterbox, capitalize_text
+from .links import Site, classify
+from .ytdl import MAX_FILESIZE
 from io import BytesIO, BufferedReader
 
 if TYPE_CHECKING:
     from core import Context
 
 
-def match_filter(info: Dict[Any, Any]):
-    if info.get("live_status", None) == "is_live":
-        raise VideoIsLive()
+def cobalt_checker(url: str) -> bool:
+    link = classify(url)
+    return link is not None and link.cobalt
 
 
-def cobalt_checker(url: str) -> bool:
-    if (
-        TIKTOK_RE.search(url)
-        or YT_SHORT_RE.search(url)
-        or YOUTUBE_RE.search(url)
-        or TWITTER_RE.search(url)
-        or REDDIT_RE.search(url)
-    ):
-        return True
-    else:
-        return False
+CHUNK_SIZE = 256 * 1024
+
+
+def _open_partial(path: str) -> IO[bytes]:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return open(path, "wb")
+
+
+def _discard_partial(fp: IO[bytes]) -> None:
+    fp.close()
+    try:
+        os.remove(fp.name)
+    except FileNotFoundError:
+        pass
+
+
+async def stream_to_file(
+    session: aiohttp.ClientSession,
+    url: str,
+    path: str,
+    *,
+    max_size: int = MAX_FILESIZE,
+) -> int:
+    """Writes the body of `url` to `path` as it arrives, returns the size in bytes.
+
+    Only one chunk is held in memory at a time. The body goes to `path.part`
+    and is moved into place once complete, FileTooLarge is raised as soon as
+    it goes over `max_size` and the partial file is removed."""
+    size = 0
+
+    async with session.get(url=url) as body:
+        body.raise_for_status()
+        if body.content_length is not None and body.content_length > max_size:
+            raise FileTooLarge()
+
+        fp = await asyncio.to_thread(_open_partial, f"{path}.part")
+        try:
+            async for chunk in body.content.iter_chunked(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLarge()
+
+                await asyncio.to_thread(fp.write, chunk)
+        except BaseException:
+            await asyncio.to_thread(_discard_partial, fp)
+            raise
+
+    await asyncio.to_thread(fp.close)
+    await asyncio.to_thread(os.replace, fp.name, path)
+    return size
 
 
 class Downloader:
@@ -57,12 +90,19 @@ class Downloader:
         hidden: Optional[bool] = False,
     ) -> None:
         self.ctx = ctx
-        self.url = url
+        # auto downloads pass the whole message, from here on only the link matters
+        self.link = classify(url)
+        self.url = self.link.url if self.link else url
         self.format = format
         self.twitterGif = twitterGif
         self.picker = picker
         self.filename = filename
         self.hidden = hidden
+        self.downloaded: int = 0
+        # base paths reserved in files/downloads, removed once the download is done
+        self.artifacts: List[str] = []
+        self.MVD: Optional[discord.Message] = None
+        self.key = DownloadCache.key(self.url, format, twitterGif)
         self.headers = {
             "Accept": "application/json",
             "Content-Type": "application/json",
@@ -75,30 +115,30 @@ class Downloader:
             "twitterGif": self.twitterGif,
         }
 
+    @property
+    def site(self) -> Optional[Site]:
+        return self.link.site if self.link else None
+
     async def _download(self) -> discord.File:
-        if YT_CLIP_RE.search(self.url):
+        if self.site is Site.youtube_clip:
             raise DownloadError("Youtube clips are not supported at the moment, sorry.")
 
-        if cobalt_checker(self.url):
-            s = await self.ctx.session.post(
+        if self.link and self.link.cobalt:
+            async with self.ctx.bot.upstreams["cobalt"].post(
+                "https://cobalt.catgirls.one/",
                 headers=self.headers,
-                url="https://cobalt.catgirls.one/",
                 json=self.json_data,
-            )
-
-            data: Dict[Any, Any] = await s.json()
+            ) as s:
+                data: Dict[Any, Any] = await s.json()
 
             try:
                 await self.ctx.send(file=self.ctx.bot.too_big(json.dumps(data, indent=4))) # debug
-                async with self.ctx.session.get(url=data["url"]) as body:
-                    bData = await body.read()
-
-                if TWITTER_RE.search(self.url) and data["status"] == "stream":
+                if self.site is Site.twitter and data["status"] == "stream":
                     self.format = "gif"
 
-                file = discord.File(
-                    BytesIO(bData), filename=f"{self.filename}.{self.format}"
-                )
+                file = await self._stream(data["url"], self.format)
+            except DownloadError:
+                raise
             except Exception as err:
                 err_chan: discord.TextChannel = self.ctx.bot.get_channel(989112775487922237)  # type: ignore
                 _id = secrets.token_urlsafe(5)
@@ -124,24 +164,22 @@ class Downloader:
 
         return file
 
-    @to_thread
-    def yt_dlp_download(self) -> discord.File:
-        video_match = VIDEOS_RE.search(self.url)
+    async def _stream(self, url: str, format: str) -> discord.File:
+        # every picker item shares self.filename, so the file on disk gets its own name
+        path = f"{self._reserve()}.{format}"
+        self.downloaded += await stream_to_file(self.ctx.session, url, path)
+
+        return discord.File(path, filename=f"{self.filename}.{format}")
+
+    async def yt_dlp_download(self) -> discord.File:
         audio = False
 
-        if video_match is None or video_match and video_match.group(0) == "":
+        if self.link is None:
             raise InvalidWebsite()
 
-        video = video_match.group(0)
-
-        options: Dict[Any, Any] = {
-            "outtmpl": rf"files/downloads/{self.filename}.%(ext)s",
-            "quiet": True,
-            "max_filesize": 100_000_000,
-            "match_filter": match_filter,
-        }
+        video = self.link.url
 
-        if SOUNDCLOUD_RE.search(video) or self.format == "mp3":
+        if self.site is Site.soundcloud or self.format == "mp3":
             self.format = "mp3"
             audio = True
 
@@ -160,70 +198,55 @@ class Downloader:
         #     ]
         #     video = re.sub("x.com", "twitter.com", video, count=1)
 
-        if audio:
-            options.setdefault("postprocessors", []).append(
-                {
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": format,
-                    "preferredquality": "192",
-                }
-            )
-            options["format"] = "bestaudio/best"
-        else:
-            options["format"] = f"bestvideo+bestaudio[ext={self.format}]/best"
-
-        with yt_dlp.YoutubeDL(options) as ydl:
-            try:
-                ydl.download(video)
-                self.ctx.bot.current_downloads.append(f"{self.filename}.{self.format}")
-            except ValueError as e:
-                raise DownloadError(str(e))
-
-        return discord.File(
-            f"files/downloads/{self.filename}.{self.format}",
-            filename=f"{self.filename}.{self.format}",
-        )
+        return await self._ytdl(video, audio=audio)
 
     async def manual_dl(self, cookies: Optional[str]) -> discord.File:
-        """Manually runs the yt-dlp command line download.
+        """Downloads the URL as is with yt-dlp, without checking the website.
 
         Cookies should be a path to the cookies"""
-        cmd = f"venv/bin/yt-dlp {self.url} "
-        if cookies:
-            cmd += f"--cookies {cookies} "
-        cmd += f"--format bestvideo+bestaudio[ext={self.format}]/best "
-        cmd += f'-o "{self.filename}.%(ext)s" '
-        cmd += '-P "files/downloads"'
+        return await self._ytdl(self.url, cookies=cookies)
+
+    async def _ytdl(
+        self, url: str, *, audio: bool = False, cookies: Optional[str] = None
+    ) -> discord.File:
+        # same as _stream, don't let downloads sharing self.filename clobber each other
+        outtmpl = f"{self._reserve()}.%(ext)s"
+        path = await self.ctx.bot.ytdl.download(
+            url, outtmpl, self.format, audio=audio, cookies=cookies
+        )
+        self.ctx.bot.current_downloads.append(f"{self.filename}.{self.format}")
 
-        self.ctx.bot.logger.warn(cmd)
+        try:
+            self.downloaded += os.path.getsize(path)
+        except OSError:
+            pass
 
-        await run(cmd)
-        self.ctx.bot.current_downloads.append(f"{self.filename}.{self.format}")
+        return discord.File(path, filename=f"{self.filename}.{self.format}")
 
-        return discord.File(
-            f"files/downloads/{self.filename}.{self.format}",
-            filename=f"{self.filename}.{self.format}",
-        )
+    def _reserve(self) -> str:
+        path = self.ctx.bot.download_files.reserve()
+        self.artifacts.append(path)
+        return path
 
-    async def download(self):
+    async def _fetch(self) -> List[Tuple[str, str]]:
+        """Downloads everything for the URL, returns (path, filename) pairs."""
         files: List[discord.File] = []
-        MVD: None | discord.Message = None
 
-        if INSTAGRAM_RE.search(self.url):
+        if self.site is Site.instagram:
             files.append(
                 await self.manual_dl(cookies="files/cookies/instagram-cookies.txt")
             )
 
-        elif TWITTER_RE.search(self.url):
-            s = await self.ctx.session.post(
+        elif self.site is Site.twitter:
+            async with self.ctx.bot.upstreams["cobalt"].post(
+                "https://olly.imput.net/",
                 headers=self.headers,
-                url="https://olly.imput.net/",
                 json=self.json_data,
-            )
-            data: Dict[Any, Any] = await s.json()
+            ) as s:
+                data: Dict[Any, Any] = await s.json()
             
             if data.get("status") == "picker":
-                MVD = await self.ctx.send("Multiple videos detected, downloading.")
+                self.MVD = await self.ctx.send("Multiple videos detected, downloading.")
                 for pd in data["picker"]:
                     tempformat = "mp4"
 
@@ -233,45 +256,86 @@ class Downloader:
                     if pd["type"] == "gif":
                         tempformat = "gif"
 
-                    async with self.ctx.session.get(url=pd["url"]) as body:
-                        bData = await body.read()
-
-                    files.append(
-                        discord.File(
-                            BytesIO(bData), filename=f"{self.filename}.{tempformat}"
-                        )
-                    )
+                    files.append(await self._stream(pd["url"], tempformat))
 
             else:
                 files.append(await self._download())
         else:
             files.append(await self._download())
-        try:
 
+        for file in files:
+            file.close()
+
+        return [(file.fp.name, file.filename) for file in files]  # type: ignore
+
+    async def _send(self, entry: CachedDownload) -> None:
+        cache: DownloadCache = self.ctx.bot.download_cache
+        reference = self.ctx.message.to_reference(fail_if_not_exists=False)
+
+        urls = entry.fresh_urls()
+        if urls:
             await self.ctx.send(
+                "\n".join(urls),
+                mention_author=True,
+                reference=reference,
+                ephemeral=self.hidden,
+            )
+            return
+
+        try:
+            files = [discord.File(path, filename=name) for path, name in entry.files]
+        except FileNotFoundError:
+            # evicted between finishing and getting here
+            await cache.discard(entry.key)
+            raise DownloadError("Something went wrong, try that download again.")
+
+        try:
+            message = await self.ctx.send(
                 files=files,
                 mention_author=True,
-                reference=self.ctx.message.to_reference(fail_if_not_exists=False),
+                reference=reference,
                 ephemeral=self.hidden,
             )
         except discord.HTTPException:
             text = "Files were too big, try a smaller video. **These will delete after 72 hours**\n\n"
-            for file in files:
-                bytes = await self.file_to_bytes(file)
-                url = await litterbox(self.ctx.session, bytes, file.filename)
-                text += f"{url}\n"
+            urls = []
+            upstream = self.ctx.bot.upstreams["litterbox"]
+            for path, name in entry.files:
+                # upload straight from disk rather than reading it all in
+                with open(path, "rb") as fp:
+                    url = await litterbox(upstream, fp, name)
+                urls.append(url.strip())
+            text += "\n".join(urls)
 
             await self.ctx.send(text, ephemeral=self.hidden)
+            if not self.hidden:
+                cache.remember(entry, urls, time.time() + 72 * 3600)
+        else:
+            # ephemeral attachments aren't something to hand out to everyone
+            if not self.hidden:
+                cache.remember_attachments(entry, [a.url for a in message.attachments])
 
-        if MVD:
-            await MVD.delete()
+    async def send_cached(self) -> bool:
+        """Sends the result if this URL is cached or already downloading.
 
-        for file in files:
+        Lets callers skip queueing a download that would not do any work."""
+        entry = await self.ctx.bot.download_cache.peek(self.key)
+        if entry is None:
+            return False
 
-            try:
-                await run(f"cd files/downloads && rm {file.filename}")
-            except:
-                pass
+        await self._send(entry)
+        return True
+
+    async def download(self):
+        try:
+            entry = await self.ctx.bot.download_cache.get_or_fetch(
+                self.key, self._fetch
+            )
+            await self._send(entry)
+        finally:
+            await self.ctx.bot.download_files.release(self.artifacts)
+            if self.MVD:
+                await self.MVD.delete()
 
     @to_thread
     def file_to_bytes(self, file: discord.File) -> bytes:
@@ -17,6 +17,14 @@ class VideoIsLive(DownloadError):
         super().__init__(message, *args)
 
 
+class FileTooLarge(DownloadError):
+    def __init__(
+        self, message: str = "That file is over 100 MB, try a smaller one.", *args: Any
+    ) -> None:
+        self.message: str = message
+        super().__init__(message, *args)
+
+
 class InvalidWebsite(DownloadError):
     def __init__(
         self,
@@ -27,12 +35,24 @@ class InvalidWebsite(DownloadError):
         super().__init__(message, *args)
 
 
+class UpstreamUnavailable(commands.CommandError):
+    def __init__(
+        self,
+        message: str = "That service isn't responding right now, try again in a bit.",
+        *args: Any
+    ) -> None:
+        self.message: str = message
+        super().__init__(message, *args)
+
+
 ignored_errors = commands.NotOwner
 valid_errors = (
     commands.BadArgument,
     InvalidWebsite,
     VideoIsLive,
+    FileTooLarge,
     DownloadError,
+    UpstreamUnavailable,
     commands.CommandInvokeError,
     commands.CommandError,
     commands.MissingPermissions,
@@ -9,6 +9,7 @@ import sys
 import textwrap
 from io import BytesIO
 from typing import (
+    IO,
     TYPE_CHECKING,
     Any,
     Awaitable,
@@ -35,6 +36,8 @@ from .vars import USER_FLAGS
 if TYPE_CHECKING:
     from core import Fishie
 
+    from .upstream import Upstream
+
 
 def to_thread(func: Callable[P, T]) -> Callable[P, Awaitable[T]]:
     async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
@@ -138,12 +141,12 @@ async def get_sp_cover(bot: Fishie, query: str) -> Tuple[str, bool]:
 
     data = {"q": query, "type": "album", "limit": "1"}
 
-    async with bot.session.get(url, headers=headers, params=data) as r:
+    async with bot.upstreams["spotify"].get(url, headers=headers, params=data) as r:
         results = await r.json()
 
     try:
         cover = results["albums"]["items"][0]["images"][0]["url"]
-        nsfw = results["albums"]["items"][0]["id"] in bot.db_cache.nsfw_covers
+        nsfw = bot.db_cache.is_nsfw_cover(results["albums"]["items"][0]["id"])
 
         try:
             bot.cached_covers[query] = (cover, nsfw)
@@ -170,71 +173,118 @@ async def to_image(
         return data if bytes else BytesIO(data)
 
 
+def _load_frames(
+    im: Image.Image,
+) -> Tuple[List[Image.Image], List[int], List[int]]:
+    frames: List[Image.Image] = []
+    durations: List[int] = []
+    disposals: List[int] = []
+
+    for frame in ImageSequence.Iterator(im):
+        durations.append(frame.info.get("duration", 100))
+        disposals.append(getattr(frame, "disposal_method", 0))
+        # palette images can only be resized with NEAREST
+        frames.append(frame.convert("RGBA"))
+
+    return frames, durations, disposals
+
+
+def _encode_animated(
+    frames: List[Image.Image],
+    durations: List[int],
+    disposals: List[int],
+    scale: float,
+) -> BytesIO:
+    size = tuple(max(1, round(i * scale)) for i in frames[0].size)
+    if size != frames[0].size:
+        frames = [f.resize(size, resample=Image.BICUBIC, reducing_gap=2.0) for f in frames]  # type: ignore
+
+    data = BytesIO()
+    frames[0].save(
+        data,
+        "gif",
+        save_all=True,
+        append_images=frames[1:],
+        duration=durations,
+        disposal=disposals,
+        loop=0,
+        optimize=True,
+    )
+    data.seek(0)
+    return data
+
+
+def _encode_still(im: Image.Image, format: str, scale: float) -> BytesIO:
+    size = tuple(max(1, round(i * scale)) for i in im.size)
+    data = BytesIO()
+    im.resize(size, resample=Image.BICUBIC, reducing_gap=2.0).save(data, format)  # type: ignore
+    data.seek(0)
+    return data
+
+
 # https://github.com/CuteFwan/Koishi/blob/master/cogs/utils/images.py#L4-L34
 def resize_to_limit(data: BytesIO, limit: int) -> BytesIO:
     """
     Downsize it for huge PIL images.
-    Half the resolution until the byte count is within the limit.
-    """
-    current_size = data.getbuffer().nbytes
-    while current_size > limit:
-        with Image.open(data) as im:
-            data = BytesIO()
-            if im.format == "PNG":
-                im = im.resize(tuple([i // 2 for i in im.size]), resample=Image.BICUBIC)  # type: ignore
-                im.save(data, "png")
-            elif im.format == "GIF":
-                durations = []
-                new_frames = []
-                for frame in ImageSequence.Iterator(im):
-                    durations.append(frame.info["duration"])
-                    new_frames.append(
-                        frame.resize([i // 2 for i in im.size], resample=Image.BICUBIC)  # type: ignore
-                    )
-                new_frames[0].save(
-                    data,
-                    save_all=True,
-                    append_images=new_frames[1:],
-                    format="gif",
-                    version=im.info["version"],
-                    duration=durations,
-                    loop=0,
-                    transparency=0,
-                    background=im.info["background"],
-                    palette=im.getpalette(),
-                )
-            data.seek(0)
-            current_size = data.getbuffer().nbytes
-    return data
-
 
-# https://github.com/CuteFwan/Koishi/blob/master/cogs/avatar.py#L82-L102
-@to_thread
-def format_bytes(filesize_limit: int, images: List[bytes]) -> BytesIO:
-    xbound = math.ceil(math.sqrt(len(images)))
-    ybound = math.ceil(len(images) / xbound)
-    size = int(2520 / xbound)
-
-    with Image.new(
-        "RGBA", size=(xbound * size, ybound * size), color=(0, 0, 0, 0)
-    ) as base:
-        x, y = 0, 0
-        for avy in images:
-            if avy:
-                im = Image.open(BytesIO(avy)).resize(
-                    (size, size), resample=Image.BICUBIC
-                )
-                base.paste(im, box=(x * size, y * size))
-            if x < xbound - 1:
-                x += 1
+    The encoded size grows with the pixel count, so the scale that fits
+    `limit` is estimated from the byte ratio, then corrected from the size
+    each pass comes out at until one lands just under `limit`. Animated images are
+    decoded once and first just re-encoded with an optimized palette,
+    which is often enough without losing any resolution.
+    """
+    size = data.getbuffer().nbytes
+    if size <= limit:
+        return data
+
+    with Image.open(data) as im:
+        if getattr(im, "is_animated", False):
+            frames, durations, disposals = _load_frames(im)
+            encode: Callable[[float], BytesIO] = lambda scale: _encode_animated(
+                frames, durations, disposals, scale
+            )
+
+            out = encode(1.0)
+            if out.getbuffer().nbytes <= limit:
+                return out
+            size = out.getbuffer().nbytes
+        else:
+            format = im.format if im.format in ("PNG", "JPEG", "WEBP") else "PNG"
+            if im.mode in ("RGB", "RGBA", "L"):
+                still = im
             else:
-                x = 0
-                y += 1
-        buffer = BytesIO()
-        base.save(buffer, "png")
-        buffer.seek(0)
-        buffer = resize_to_limit(buffer, filesize_limit)
-        return buffer
+                # CMYK and YCbCr JPEGs, JPEG has no alpha channel to convert to
+                still = im.convert("RGB" if format == "JPEG" else "RGBA")
+            encode = lambda scale: _encode_still(still, format, scale)
+
+        # re-encoding alone can shrink it a lot (a quality 95 JPEG saved at 75),
+        # so each pass corrects the scale from the size it actually came out
+        # at, up as well as down, keeping the biggest one that fits
+        scale = min(1.0, math.sqrt(limit / size))
+        best: Optional[BytesIO] = None
+        best_scale = 0.0
+        for _ in range(4):
+            out = encode(scale)
+            out_size = out.getbuffer().nbytes
+            if out_size <= limit:
+                best, best_scale = out, scale
+                if scale >= 1.0 or out_size >= limit * 0.85:
+                    return out
+
+            scale = min(1.0, scale * math.sqrt(limit / out_size) * 0.97)
+            if best is not None and scale <= best_scale:
+                return best
+
+        if best is not None:
+            return best
+
+        # only for images that barely shrink when downscaled
+        while out_size > limit and min(im.size) * scale > 1:
+            scale /= 2
+            out = encode(scale)
+            out_size = out.getbuffer().nbytes
+
+        return out
 
 
 def format_status(member: discord.Member) -> str:
@@ -340,8 +390,8 @@ async def identify_mobile(self) -> None:
 
 
 async def litterbox(
-    session: aiohttp.ClientSession,
-    file: bytes,
+    session: Union[aiohttp.ClientSession, Upstream],
+    file: Union[bytes, IO[bytes]],
     filename: str,
     time: Union[
         Literal["1h"], Literal["12h"], Literal["12h"], Literal["24h"], Literal["72h"]
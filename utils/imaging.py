@@ -0,0 +1,552 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import multiprocessing
+import os
+import secrets
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from io import BytesIO
+from multiprocessing.shared_memory import SharedMemory
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from discord.ext import commands
+from PIL import Image
+
+from .functions import resize_to_limit, to_image
+
+if TYPE_CHECKING:
+    import aiohttp
+
+__all__ = (
+    "SHARED_THRESHOLD",
+    "TILE_SIZE",
+    "tile_key",
+    "ImageJobStats",
+    "ImagePool",
+    "TileCache",
+    "GridRenderer",
+)
+
+# payloads smaller than this are cheaper to pickle than to put in shared memory
+SHARED_THRESHOLD = 256 * 1024
+
+# the side of the thumbnails kept in the tile cache, grid tiles are never bigger
+TILE_SIZE = 512
+
+
+def tile_key(owner_id: int, asset_key: str) -> str:
+    """The name an avatar's thumbnail is cached under.
+
+    The owner is part of it because default avatars share their keys."""
+    return f"{owner_id}_{asset_key}"
+
+
+class _Shared(NamedTuple):
+    """Bytes, or a list of them, left in a shared memory block."""
+
+    name: str
+    sizes: List[int]
+    many: bool
+
+
+def _share(data: Union[bytes, List[bytes]], name: Optional[str] = None) -> SharedMemory:
+    items = data if isinstance(data, list) else [data]
+    shm = SharedMemory(name=name, create=True, size=max(1, sum(map(len, items))))
+    offset = 0
+    for item in items:
+        shm.buf[offset : offset + len(item)] = item
+        offset += len(item)
+
+    return shm
+
+
+def _unshare(shared: _Shared, *, unlink: bool = False) -> Union[bytes, List[bytes]]:
+    shm = SharedMemory(name=shared.name)
+    try:
+        items: List[bytes] = []
+        offset = 0
+        for size in shared.sizes:
+            items.append(bytes(shm.buf[offset : offset + size]))
+            offset += size
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+    return items if shared.many else items[0]
+
+
+def _discard(name: str) -> None:
+    try:
+        shm = SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+
+    shm.close()
+    shm.unlink()
+
+
+def _should_share(arg: Any) -> bool:
+    if isinstance(arg, (bytes, bytearray, memoryview)):
+        return len(arg) >= SHARED_THRESHOLD
+
+    return (
+        isinstance(arg, list)
+        and bool(arg)
+        and all(isinstance(a, bytes) for a in arg)
+        and sum(map(len, arg)) >= SHARED_THRESHOLD
+    )
+
+
+# everything below runs inside the worker processes
+
+
+def _run(
+    func: Callable[..., BytesIO], args: List[Any], out: str
+) -> Union[bytes, _Shared]:
+    args = [_unshare(a) if isinstance(a, _Shared) else a for a in args]
+    result = func(*args).getbuffer()
+
+    if len(result) < SHARED_THRESHOLD:
+        return bytes(result)
+
+    # left for the bot to unlink once it has read it, the bot picks the name
+    # so it can unlink it even if this result never reaches it
+    shm = _share(result, out)  # type: ignore
+    shm.close()
+    return _Shared(shm.name, [len(result)], False)
+
+
+def _warm() -> None:
+    # unpickling a reference to this module is what imports it, and Pillow, in the worker
+    pass
+
+
+def _resize(data: bytes, limit: int) -> BytesIO:
+    return resize_to_limit(BytesIO(data), limit)
+
+
+def _thumbnail(data: bytes, size: int) -> BytesIO:
+    with Image.open(BytesIO(data)) as im:
+        im.draft("RGB", (size, size))
+        # animated avatars keep their first frame, like in the grids
+        thumbnail = im.convert("RGBA")
+
+    thumbnail.thumbnail((size, size), resample=Image.BICUBIC, reducing_gap=2.0)
+    buffer = BytesIO()
+    thumbnail.save(buffer, "webp", quality=90, method=4)
+    return buffer
+
+
+def _grid_tile(data: bytes, size: int) -> BytesIO:
+    with Image.open(BytesIO(data)) as im:
+        # lets JPEGs decode at a fraction of their size, a no-op for the rest
+        im.draft("RGB", (size, size))
+        tile = im.convert("RGBA")
+
+    if tile.size != (size, size):
+        tile = tile.resize((size, size), resample=Image.BICUBIC, reducing_gap=2.0)
+
+    return BytesIO(tile.tobytes())
+
+
+# https://github.com/CuteFwan/Koishi/blob/master/cogs/avatar.py#L82-L102
+def _grid_compose(limit: int, size: int, columns: int, tiles: List[bytes]) -> BytesIO:
+    rows = math.ceil(len(tiles) / columns)
+    with Image.new("RGBA", (columns * size, rows * size), (0, 0, 0, 0)) as base:
+        for index, tile in enumerate(tiles):
+            # avatars that couldn't be downloaded are left blank
+            if tile:
+                y, x = divmod(index, columns)
+                base.paste(
+                    Image.frombytes("RGBA", (size, size), tile), (x * size, y * size)
+                )
+
+        buffer = BytesIO()
+        base.save(buffer, "png")
+
+    buffer.seek(0)
+    return resize_to_limit(buffer, limit)
+
+
+@dataclass()
+class ImageJobStats:
+    jobs: int = 0
+    failures: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    last_time: float = 0.0
+
+    @property
+    def average_time(self) -> float:
+        return self.total_time / self.jobs if self.jobs else 0.0
+
+
+class ImagePool:
+    """Runs Pillow work in worker processes so it can't hold the bot's GIL.
+
+    Jobs take bytes and give bytes back. Payloads over `SHARED_THRESHOLD`
+    are passed through shared memory instead of being pickled through the
+    executor's pipe. Timings are kept per kind of job in `stats`.
+    """
+
+    def __init__(self, workers: int = 2, *, jobs_per_worker: int = 100) -> None:
+        self.workers = workers
+        self.jobs_per_worker = jobs_per_worker
+        self.stats: Dict[str, ImageJobStats] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __repr__(self) -> str:
+        return f"<ImagePool workers={self.workers}>"
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=self.jobs_per_worker,
+            )
+
+        return self._executor
+
+    def start(self) -> None:
+        """Starts the workers in the background so the first jobs don't wait on them."""
+        for _ in range(self.workers):
+            self.executor.submit(_warm)
+
+    async def submit(
+        self, name: str, func: Callable[..., BytesIO], *args: Any
+    ) -> bytes:
+        """Runs `func(*args)` in a worker and returns the bytes of the BytesIO it returns.
+
+        `func` must be a module level function so it can be pickled."""
+        stats = self.stats.setdefault(name, ImageJobStats())
+        blocks: List[SharedMemory] = []
+        payload: List[Any] = []
+
+        for arg in args:
+            if _should_share(arg):
+                shm = _share(arg)
+                blocks.append(shm)
+                many = isinstance(arg, list)
+                sizes = list(map(len, arg)) if many else [len(arg)]
+                payload.append(_Shared(shm.name, sizes, many))
+                stats.bytes_in += sum(sizes)
+            else:
+                payload.append(arg)
+                if isinstance(arg, bytes):
+                    stats.bytes_in += len(arg)
+
+        out = f"fishie_{secrets.token_hex(8)}"
+        future: Optional[Future[Any]] = None
+        abandoned = False
+
+        def release(_: Future[Any]) -> None:
+            # runs when the worker is done, the result is ours to unlink if
+            # nothing is waiting for it anymore
+            if abandoned:
+                _discard(out)
+
+        start = time.perf_counter()
+        try:
+            future = self.executor.submit(_run, func, payload, out)
+            future.add_done_callback(release)
+            result = await asyncio.wrap_future(future)
+        except BaseException as e:
+            # cancelled, or the worker made the result and then the pool broke
+            abandoned = True
+            if future is not None and future.done():
+                _discard(out)
+
+            if isinstance(e, BrokenProcessPool):
+                # a worker died mid-job, the executor can't be used after that
+                stats.failures += 1
+                self._executor = None
+                raise commands.CommandError("The image worker crashed, try again.")
+            if isinstance(e, Exception):
+                stats.failures += 1
+            raise
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+        if isinstance(result, _Shared):
+            result = _unshare(result, unlink=True)
+
+        elapsed = time.perf_counter() - start
+        stats.jobs += 1
+        stats.bytes_out += len(result)
+        stats.last_time = elapsed
+        stats.total_time += elapsed
+        stats.max_time = max(stats.max_time, elapsed)
+        return result  # type: ignore
+
+    async def resize_to_limit(self, data: bytes, limit: int) -> BytesIO:
+        if len(data) <= limit:
+            return BytesIO(data)
+
+        return BytesIO(await self.submit("resize", _resize, data, limit))
+
+    async def thumbnail(self, data: bytes, size: int = TILE_SIZE) -> bytes:
+        """A WEBP thumbnail of the image that fits in a `size` square."""
+        return await self.submit("thumbnail", _thumbnail, data, size)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class TileCache:
+    """Thumbnails of archived avatars, kept on disk under `root`.
+
+    Thumbnails are written when an asset is archived, so history views can
+    be drawn without downloading anything again. Once the files add up to
+    more than `max_bytes` the least recently used ones are removed. Which
+    files exist and their sizes are indexed in memory, `load` rebuilds the
+    index from the directory.
+    """
+
+    def __init__(
+        self, root: str = "files/cache/tiles", *, max_bytes: int = 500_000_000
+    ) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        # name -> size on disk, least recently used first
+        self.entries: OrderedDict[str, int] = OrderedDict()
+
+    def __repr__(self) -> str:
+        return f"<TileCache entries={len(self.entries)} size={self.size}>"
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.entries
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.webp")
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        now = time.time()
+        files: List[Tuple[float, str, int]] = []
+        try:
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+
+                    # left over from a crash mid-write
+                    if entry.name.endswith(".tmp") and now - stat.st_mtime > 3600:
+                        self._remove_path(entry.path)
+                    if not entry.name.endswith(".webp"):
+                        continue
+                    files.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+        except FileNotFoundError:
+            pass
+
+        files.sort()
+        return files
+
+    async def load(self) -> int:
+        """Indexes the thumbnails already on disk, returns how many there are."""
+        files = await asyncio.to_thread(self._scan)
+        self.entries = OrderedDict((name, size) for _, name, size in files)
+        self.size = sum(self.entries.values())
+        await self._evict()
+        return len(self.entries)
+
+    def _read(self, name: str) -> Optional[bytes]:
+        path = self._path(name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # the mtime is what orders the files after a restart
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return data
+
+    def _write(self, name: str, data: bytes) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        # the archiver and a grid can write the same tile at once
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.root)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(name))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    @staticmethod
+    def _remove_path(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _remove(self, names: List[str]) -> None:
+        for name in names:
+            self._remove_path(self._path(name))
+
+    async def get(self, name: str) -> Optional[bytes]:
+        if name not in self.entries:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(name)
+        data = await asyncio.to_thread(self._read, name)
+        if data is None:
+            # removed from under us
+            self.size -= self.entries.pop(name, 0)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return data
+
+    async def put(self, name: str, data: bytes) -> None:
+        await asyncio.to_thread(self._write, name, data)
+        self.size += len(data) - self.entries.pop(name, 0)
+        self.entries[name] = len(data)
+        await self._evict()
+
+    async def _evict(self) -> None:
+        names: List[str] = []
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            name, size = self.entries.popitem(last=False)
+            self.size -= size
+            names.append(name)
+
+        if names:
+            self.evictions += len(names)
+            await asyncio.to_thread(self._remove, names)
+
+
+class GridRenderer:
+    """Renders the avatar history grids.
+
+    Tiles are cut from the thumbnails in `tiles`, avatars that have none
+    are downloaded `concurrency` at a time and their thumbnail is cached
+    for next time. Only the tiles, never all of the original images, are
+    held at once. Rendered grids are kept by key (the avatar IDs and the
+    size limit) until `max_bytes` of them are cached.
+    """
+
+    def __init__(
+        self,
+        images: ImagePool,
+        tiles: TileCache,
+        *,
+        width: int = 2520,
+        concurrency: int = 8,
+        max_bytes: int = 64_000_000,
+    ) -> None:
+        self.images = images
+        self.tiles = tiles
+        self.width = width
+        self.concurrency = concurrency
+        self.max_bytes = max_bytes
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.failed_tiles: int = 0
+        self.downloaded_tiles: int = 0
+        self.cache: OrderedDict[Hashable, bytes] = OrderedDict()
+
+    def __repr__(self) -> str:
+        return f"<GridRenderer cached={len(self.cache)} size={self.size}>"
+
+    async def _tile(
+        self,
+        session: aiohttp.ClientSession,
+        name: str,
+        url: str,
+        size: int,
+        semaphore: asyncio.Semaphore,
+    ) -> bytes:
+        try:
+            async with semaphore:
+                thumbnail = await self.tiles.get(name)
+                if thumbnail is None:
+                    data: bytes = await to_image(session, url, bytes=True)  # type: ignore
+                    self.downloaded_tiles += 1
+                    thumbnail = await self.images.thumbnail(data)
+                    await self.tiles.put(name, thumbnail)
+
+                return await self.images.submit(
+                    "grid tile", _grid_tile, thumbnail, size
+                )
+        # expired CDN links and images Pillow can't read leave a blank tile
+        except Exception:
+            self.failed_tiles += 1
+            return b""
+
+    async def render(
+        self,
+        session: aiohttp.ClientSession,
+        key: Hashable,
+        avatars: Sequence[Tuple[str, str]],
+        limit: int,
+    ) -> BytesIO:
+        """Renders a grid of `avatars`, (tile name, URL) pairs, fit to `limit` bytes."""
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return BytesIO(cached)
+
+        self.misses += 1
+        columns = math.ceil(math.sqrt(len(avatars)))
+        # scaling the thumbnails up would only blur them
+        size = min(self.width // columns, TILE_SIZE)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tiles = await asyncio.gather(
+            *(self._tile(session, name, url, size, semaphore) for name, url in avatars)
+        )
+
+        data = await self.images.submit(
+            "grid", _grid_compose, limit, size, columns, list(tiles)
+        )
+
+        # a blank tile may only be a CDN hiccup, the next render can fill it in
+        if not all(tiles):
+            return BytesIO(data)
+
+        self.cache[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes and len(self.cache) > 1:
+            _, old = self.cache.popitem(last=False)
+            self.size -= len(old)
+
+        return BytesIO(data)
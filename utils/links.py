@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import enum
+from re import Pattern
+from re import compile as comp
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class Site(enum.Enum):
+    tiktok = "tiktok"
+    instagram = "instagram"
+    twitch = "twitch"
+    twitter = "twitter"
+    reddit = "reddit"
+    youtube = "youtube"
+    youtube_short = "youtube_short"
+    youtube_clip = "youtube_clip"
+    soundcloud = "soundcloud"
+    pinterest = "pinterest"
+    tenor = "tenor"
+
+
+# the sites cobalt downloads for us, everything else goes through yt-dlp
+COBALT_SITES = frozenset(
+    {Site.tiktok, Site.twitter, Site.reddit, Site.youtube, Site.youtube_short}
+)
+
+
+class Link(NamedTuple):
+    site: Site
+    url: str
+
+    @property
+    def cobalt(self) -> bool:
+        return self.site in COBALT_SITES
+
+
+# finds the URLs in a message and splits off the host, each URL is then only
+# checked against the patterns for its host
+URL_RE: Pattern[str] = comp(r"https?://([^/?#\s<>|]+)([^#\s<>|]*)")
+
+# fmt: off
+# host (without www.) -> (pattern matched against the path and query, site, canonical host)
+# patterns are tried in order and must match from the start of the path
+HOSTS: Dict[str, List[Tuple[Pattern[str], Site, str]]] = {}
+
+_TIKTOK = [(comp(r"/(?:@[\w.-]+/(?:video|photo)/\d+|t/\w+|[\w-]+)"), Site.tiktok, "")]
+_YOUTUBE = [
+    (comp(r"/shorts/[\w-]{11}"), Site.youtube_short, "www.youtube.com"),
+    (comp(r"/clip/[\w-]+"), Site.youtube_clip, "www.youtube.com"),
+    (comp(r"/watch\?(?:.*&)?v=([\w-]{11})"), Site.youtube, "www.youtube.com"),
+]
+_TWITTER = [(comp(r"/\w+/status/\d+"), Site.twitter, "twitter.com")]
+_REDDIT = [(comp(r"/r/\w{1,21}/comments/[a-z0-9]+"), Site.reddit, "www.reddit.com")]
+_SOUNDCLOUD = [(comp(r"/[\w-]{3,25}(?:/[\w-]{3,255})?"), Site.soundcloud, "")]
+
+for _host in ("tiktok.com", "vt.tiktok.com", "vm.tiktok.com", "m.tiktok.com"):
+    HOSTS[_host] = _TIKTOK
+for _host in ("youtube.com", "m.youtube.com"):
+    HOSTS[_host] = _YOUTUBE
+for _host in ("twitter.com", "x.com", "mobile.twitter.com"):
+    HOSTS[_host] = _TWITTER
+for _host in ("reddit.com", "old.reddit.com"):
+    HOSTS[_host] = _REDDIT
+for _host in ("soundcloud.com", "on.soundcloud.com", "m.soundcloud.com"):
+    HOSTS[_host] = _SOUNDCLOUD
+
+HOSTS["youtu.be"] = [(comp(r"/([\w-]{11})"), Site.youtube, "www.youtube.com")]
+HOSTS["instagram.com"] = [(comp(r"/(?:p|tv|reel|reels)/[\w-]{5,}"), Site.instagram, "www.instagram.com")]
+HOSTS["clips.twitch.tv"] = [(comp(r"/[\w-]+"), Site.twitch, "")]
+HOSTS["pinterest.com"] = [(comp(r"/pin/\d+"), Site.pinterest, "www.pinterest.com")]
+HOSTS["pin.it"] = [(comp(r"/\w+"), Site.pinterest, "")]
+HOSTS["tenor.com"] = [(comp(r"/view/\S+"), Site.tenor, "tenor.com")]
+# fmt: on
+
+
+def _classify(host: str, target: str) -> Optional[Link]:
+    host = host.lower()
+    if host.startswith("www."):
+        host = host[4:]
+
+    patterns = HOSTS.get(host)
+    if patterns is None:
+        return None
+
+    for pattern, site, canonical_host in patterns:
+        match = pattern.match(target)
+        if match is None:
+            continue
+
+        netloc = canonical_host or host
+        if site is Site.youtube:
+            # youtu.be/<id> and watch?v=<id>&si=... all become the same link
+            return Link(site, f"https://{netloc}/watch?v={match.group(1)}")
+
+        return Link(site, f"https://{netloc}{match.group(0).rstrip('/')}")
+
+    return None
+
+
+def classify_url(url: str) -> Optional[Link]:
+    """Returns the site and canonical form of a single URL, if it is one we download."""
+    match = URL_RE.fullmatch(url.split("#", 1)[0])
+    return match and _classify(*match.groups())
+
+
+def classify(text: str) -> Optional[Link]:
+    """Returns the first link in `text` that is from a site we download from.
+
+    The text is scanned once for URLs, each URL is then dispatched on its
+    host and checked against only that site's patterns."""
+    if "http" not in text:
+        return None
+
+    for match in URL_RE.finditer(text):
+        link = _classify(*match.groups())
+        if link is not None:
+            return link
+
+    return None
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+__all__ = (
+    "RESPONSE_TTLS",
+    "DISK_SERVICES",
+    "normalize_query",
+    "ResponseCache",
+)
+
+# how long a response is reused for, per service, in seconds
+RESPONSE_TTLS: Dict[str, float] = {
+    "google": 6 * 3600.0,
+    "google_image": 6 * 3600.0,
+    "youtube": 3600.0,
+    "spotify": 3600.0,
+    "urban": 24 * 3600.0,
+    # new reviews should show up fairly quickly
+    "reviewdb": 300.0,
+}
+
+# services whose responses are also written to disk, the quota bound ones
+DISK_SERVICES = frozenset({"google", "google_image", "youtube", "urban"})
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+class ResponseCache:
+    """Caches decoded API responses for the search commands.
+
+    Entries are keyed by service, normalized query and anything else that
+    changes the response (like safe search), and live for the service's
+    TTL in `RESPONSE_TTLS`. The least recently used entry is evicted once
+    `max_entries` is reached. Concurrent lookups of a key that is still
+    being fetched wait for that request instead of making their own.
+    Responses of `DISK_SERVICES` are also kept as JSON under `root` so they
+    survive restarts, `root=None` turns that off.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = "files/cache/responses",
+        *,
+        max_entries: int = 2000,
+        max_disk_entries: int = 20_000,
+    ) -> None:
+        self.root = root
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self.coalesced: int = 0
+        # key -> (expires at, response)
+        self.entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future[Any]] = {}
+        self._writes: int = 0
+        self._pruning: Optional[asyncio.Task[int]] = None
+
+    def __repr__(self) -> str:
+        return f"<ResponseCache entries={len(self.entries)} hits={self.hits} misses={self.misses}>"
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def key(service: str, query: str, *options: object) -> str:
+        raw = "|".join([service, normalize_query(query), *map(str, options)])
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")  # type: ignore
+
+    def _get(self, key: str) -> Optional[Tuple[float, Any]]:
+        item = self.entries.get(key)
+        if item is None:
+            return None
+
+        if item[0] <= time.time():
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return item
+
+    def _set(self, key: str, expires: float, response: Any) -> None:
+        self.entries[key] = (expires, response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _read(self, key: str) -> Optional[Tuple[float, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                expires, response = json.load(f)
+        except OSError:
+            return None
+        except ValueError:
+            # a half written file from a crash
+            expires = 0.0
+
+        if expires <= time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        return expires, response
+
+    def _write(self, key: str, expires: float, response: Any) -> None:
+        os.makedirs(self.root, exist_ok=True)  # type: ignore
+        path = self._path(key)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump([expires, response], f)
+        os.replace(f"{path}.tmp", path)
+
+    async def get_or_fetch(
+        self,
+        service: str,
+        query: str,
+        fetch: Callable[[], Awaitable[Any]],
+        *options: object,
+    ) -> Any:
+        """Returns the cached response for this lookup, running `fetch` if there is none.
+
+        `fetch` should raise instead of returning an error response, so that
+        errors aren't cached. Responses of disk services have to be JSON."""
+        key = self.key(service, query, *options)
+        disk = self.root is not None and service in DISK_SERVICES
+
+        while True:
+            item = self._get(key)
+            if item is not None:
+                self.hits += 1
+                return item[1]
+
+            future = self._inflight.get(key)
+            if future is None:
+                break
+
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # the request we waited on was cancelled, not us, try again
+
+        future = asyncio.get_running_loop().create_future()
+        # nothing might be waiting on it, don't warn about unretrieved errors
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+
+        try:
+            item = await asyncio.to_thread(self._read, key) if disk else None
+            if item is not None:
+                self.disk_hits += 1
+                expires, response = item
+            else:
+                self.misses += 1
+                response = await fetch()
+                expires = time.time() + RESPONSE_TTLS.get(service, 300.0)
+                if disk:
+                    await asyncio.to_thread(self._write, key, expires, response)
+                    self._writes += 1
+                    if self._writes % 100 == 0 and (
+                        self._pruning is None or self._pruning.done()
+                    ):
+                        self._pruning = asyncio.create_task(self.prune())
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self._set(key, expires, response)
+            future.set_result(response)
+            return response
+        finally:
+            del self._inflight[key]
+
+    async def prune(self) -> int:
+        """Removes expired responses from disk and the oldest ones past `max_disk_entries`."""
+        if self.root is None:
+            return 0
+
+        return await asyncio.to_thread(self._prune, time.time())
+
+    def _prune(self, now: float) -> int:
+        files: List[Tuple[float, str]] = []
+        removed = 0
+        try:
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    try:
+                        files.append((entry.stat().st_mtime, entry.path))
+                    except FileNotFoundError:
+                        continue
+        except FileNotFoundError:
+            return 0
+
+        files.sort()
+        excess = len(files) - self.max_disk_entries
+        shortest = min(RESPONSE_TTLS.get(s, 300.0) for s in DISK_SERVICES)
+        for index, (mtime, path) in enumerate(files):
+            if index < excess:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+            # the rest were written too recently to have expired
+            elif now - mtime < shortest:
+                break
+            elif self._read(os.path.basename(path)[:-5]) is None:
+                removed += 1
+
+        return removed
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, AsyncIterator, Deque, Dict, Optional
+
+from .errors import DownloadError
+from .formats import plural
+
+if TYPE_CHECKING:
+    from .downloads import Downloader
+
+__all__ = (
+    "DownloadStats",
+    "DownloadJob",
+    "DownloadScheduler",
+)
+
+
+@dataclass()
+class DownloadStats:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    rejected: int = 0
+    bytes: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    total_run: float = 0.0
+    max_run: float = 0.0
+
+    @property
+    def finished(self) -> int:
+        return self.completed + self.failed
+
+    @property
+    def average_wait(self) -> float:
+        return self.total_wait / self.finished if self.finished else 0.0
+
+    @property
+    def average_run(self) -> float:
+        return self.total_run / self.finished if self.finished else 0.0
+
+
+class DownloadJob:
+    """A queued or running `Downloader.download` call."""
+
+    __slots__ = (
+        "downloader",
+        "guild_id",
+        "user_id",
+        "sequence",
+        "queued_at",
+        "started_at",
+        "future",
+        "task",
+        "scheduler",
+    )
+
+    def __init__(
+        self, scheduler: DownloadScheduler, downloader: Downloader, sequence: int
+    ) -> None:
+        ctx = downloader.ctx
+        self.scheduler = scheduler
+        self.downloader = downloader
+        self.guild_id: Optional[int] = ctx.guild.id if ctx.guild else None
+        self.user_id: int = ctx.author.id
+        self.sequence = sequence
+        self.queued_at: float = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self.task: Optional[asyncio.Task[None]] = None
+
+    def __repr__(self) -> str:
+        return f"<DownloadJob guild_id={self.guild_id} user_id={self.user_id} running={self.running}>"
+
+    async def wait(self) -> None:
+        """Waits for the download to finish, cancelling it if the waiter is cancelled."""
+        try:
+            await asyncio.shield(self.future)
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None
+
+    @property
+    def position(self) -> int:
+        """How many jobs are at most ahead of this one, 0 once it is running.
+
+        This counts every job submitted earlier that is still waiting, fair
+        queueing can only ever move this job ahead of some of those."""
+        if self.running or self.future.done():
+            return 0
+
+        return 1 + sum(
+            1
+            for users in self.scheduler._waiting.values()
+            for jobs in users.values()
+            for job in jobs
+            if job.sequence < self.sequence
+        )
+
+    async def positions(self) -> AsyncIterator[int]:
+        """Yields the job's new position every time the queue moves, until it runs."""
+        last = self.position
+        while last:
+            # taken before the position so a move in between isn't missed
+            moved = self.scheduler._moved
+            position = self.position
+            if position and position != last:
+                yield position
+            last = position
+            if position:
+                await moved.wait()
+
+    def cancel(self) -> bool:
+        return self.scheduler._cancel(self)
+
+
+class DownloadScheduler:
+    """Runs downloads with a global concurrency cap and fair queueing.
+
+    Waiting jobs are grouped per guild then per user, and picked round-robin
+    at both levels, so one busy guild or one user pasting a pile of links
+    can't starve everyone else. `per_guild` and `per_user` cap how many of
+    the running slots a single guild or user can hold at once.
+    """
+
+    def __init__(
+        self,
+        *,
+        concurrency: int = 3,
+        per_guild: int = 2,
+        per_user: int = 1,
+        max_queued_per_user: int = 3,
+    ) -> None:
+        self.concurrency = concurrency
+        self.per_guild = per_guild
+        self.per_user = per_user
+        self.max_queued_per_user = max_queued_per_user
+        self.stats = DownloadStats()
+        # guild ID -> user ID -> jobs, DMs are grouped under None
+        self._waiting: OrderedDict[
+            Optional[int], OrderedDict[int, Deque[DownloadJob]]
+        ] = OrderedDict()
+        self._running: Dict[asyncio.Task[None], DownloadJob] = {}
+        self._guild_running: Dict[Optional[int], int] = {}
+        self._user_running: Dict[int, int] = {}
+        self._user_queued: Dict[int, int] = {}
+        self._sequence = itertools.count()
+        # set and replaced whenever a job leaves the queue
+        self._moved = asyncio.Event()
+
+    def __repr__(self) -> str:
+        return f"<DownloadScheduler running={len(self._running)} queued={self.queued}>"
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    @property
+    def queued(self) -> int:
+        return sum(self._user_queued.values())
+
+    def submit(self, downloader: Downloader) -> DownloadJob:
+        """Queues a download and starts it right away if there is a free slot."""
+        job = DownloadJob(self, downloader, next(self._sequence))
+
+        if self._user_queued.get(job.user_id, 0) >= self.max_queued_per_user:
+            self.stats.rejected += 1
+            raise DownloadError(
+                f"You already have {plural(self.max_queued_per_user):download} queued, wait for those to finish first."
+            )
+
+        users = self._waiting.setdefault(job.guild_id, OrderedDict())
+        users.setdefault(job.user_id, deque()).append(job)
+        self._user_queued[job.user_id] = self._user_queued.get(job.user_id, 0) + 1
+        self.stats.submitted += 1
+
+        self._dispatch()
+        return job
+
+    def cancel_user(self, user_id: int) -> int:
+        """Cancels every queued or running download of a user, returns how many."""
+        jobs = [j for j in self._running.values() if j.user_id == user_id]
+        jobs.extend(
+            job for users in self._waiting.values() for job in users.get(user_id, ())
+        )
+
+        return sum(job.cancel() for job in jobs)
+
+    async def close(self) -> None:
+        for users in list(self._waiting.values()):
+            for jobs in list(users.values()):
+                for job in list(jobs):
+                    job.cancel()
+
+        tasks = list(self._running)
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _unqueue(self, job: DownloadJob) -> None:
+        users = self._waiting[job.guild_id]
+        jobs = users[job.user_id]
+        jobs.remove(job)
+        if not jobs:
+            del users[job.user_id]
+        if not users:
+            del self._waiting[job.guild_id]
+
+        self._user_queued[job.user_id] -= 1
+        if not self._user_queued[job.user_id]:
+            del self._user_queued[job.user_id]
+
+        self._moved.set()
+        self._moved = asyncio.Event()
+
+    def _cancel(self, job: DownloadJob) -> bool:
+        if job.future.done():
+            return False
+
+        if job.task is not None:
+            return job.task.cancel()
+
+        self._unqueue(job)
+        job.future.cancel()
+        self.stats.cancelled += 1
+        return True
+
+    def _next_job(self) -> Optional[DownloadJob]:
+        for guild_id, users in self._waiting.items():
+            if self._guild_running.get(guild_id, 0) >= self.per_guild:
+                continue
+
+            for user_id, jobs in users.items():
+                if self._user_running.get(user_id, 0) >= self.per_user:
+                    continue
+
+                job = jobs[0]
+                self._unqueue(job)
+
+                # served ones go to the back so the others get the next slot
+                if user_id in users:
+                    users.move_to_end(user_id)
+                if guild_id in self._waiting:
+                    self._waiting.move_to_end(guild_id)
+
+                return job
+
+        return None
+
+    def _dispatch(self) -> None:
+        while len(self._running) < self.concurrency:
+            job = self._next_job()
+            if job is None:
+                return
+
+            self._guild_running[job.guild_id] = (
+                self._guild_running.get(job.guild_id, 0) + 1
+            )
+            self._user_running[job.user_id] = self._user_running.get(job.user_id, 0) + 1
+            job.started_at = time.perf_counter()
+            job.task = asyncio.create_task(self._run(job))
+            self._running[job.task] = job
+
+    async def _run(self, job: DownloadJob) -> None:
+        wait = job.started_at - job.queued_at  # type: ignore
+        try:
+            await job.downloader.download()
+        except asyncio.CancelledError:
+            self.stats.cancelled += 1
+            job.future.cancel()
+        except Exception as e:
+            self.stats.failed += 1
+            job.future.set_exception(e)
+        else:
+            self.stats.completed += 1
+            job.future.set_result(None)
+        finally:
+            run = time.perf_counter() - job.started_at  # type: ignore
+            self.stats.bytes += job.downloader.downloaded
+            if not job.future.cancelled():
+                self.stats.total_wait += wait
+                self.stats.max_wait = max(self.stats.max_wait, wait)
+                self.stats.total_run += run
+                self.stats.max_run = max(self.stats.max_run, run)
+
+            del self._running[job.task]  # type: ignore
+            self._release(self._guild_running, job.guild_id)
+            self._release(self._user_running, job.user_id)
+            self._dispatch()
+
+    @staticmethod
+    def _release(counts: Dict[Any, int], key: Any) -> None:
+        counts[key] -= 1
+        if not counts[key]:
+            del counts[key]
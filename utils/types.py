@@ -1,4 +1,14 @@
-from typing import List, Optional, ParamSpec, TypeAlias, TypedDict, TypeVar, Union
+from typing import (
+    Dict,
+    List,
+    NotRequired,
+    Optional,
+    ParamSpec,
+    TypeAlias,
+    TypedDict,
+    TypeVar,
+    Union,
+)
 
 import discord
 
@@ -66,6 +76,40 @@ class Keys(TypedDict):
     dagpi: str
 
 
+class DownloadsConfig(TypedDict, total=False):
+    concurrency: int
+    per_guild: int
+    per_user: int
+    max_queued_per_user: int
+
+
+class ImagesConfig(TypedDict, total=False):
+    workers: int
+    jobs_per_worker: int
+
+
+class ArchiveConfig(TypedDict, total=False):
+    workers: int
+    max_queue: int
+    rate: int
+    per: float
+
+
+class CacheConfig(TypedDict, total=False):
+    compact: bool
+
+
+class UpstreamConfig(TypedDict, total=False):
+    limit: int
+    timeout: float
+    connect_timeout: float
+    retries: int
+    keepalive: float
+    dns_ttl: int
+    failure_threshold: int
+    reset_after: float
+
+
 class ConfigTokens(TypedDict):
     bot: str
     testing_bot: str
@@ -78,3 +122,8 @@ class Config(TypedDict):
     twitter: Twitter
     ids: Ids
     webhooks: Webhooks
+    downloads: NotRequired[DownloadsConfig]
+    upstreams: NotRequired[Dict[str, UpstreamConfig]]
+    archive: NotRequired[ArchiveConfig]
+    images: NotRequired[ImagesConfig]
+    cache: NotRequired[CacheConfig]
@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import contextlib
+import random
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Mapping, Optional, Tuple
+
+import aiohttp
+
+from .errors import UpstreamUnavailable
+from .types import UpstreamConfig
+from .vars import base_header
+
+__all__ = (
+    "LATENCY_BUCKETS",
+    "RETRY_STATUSES",
+    "IDEMPOTENT_METHODS",
+    "DEFAULT_UPSTREAMS",
+    "LatencyHistogram",
+    "CircuitBreaker",
+    "Upstream",
+    "Upstreams",
+)
+
+# upper bounds of the latency buckets in seconds, the last one catches the rest
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+# statuses that mean "try again", anything else is handed to the caller as is
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+DEFAULT_UPSTREAMS: Dict[str, UpstreamConfig] = {
+    # cobalt can take a while to process a video before it answers
+    "cobalt": {"limit": 4, "timeout": 60.0},
+    "spotify": {"limit": 5, "timeout": 10.0},
+    # custom search and youtube data share a quota and a host
+    "google": {"limit": 5, "timeout": 10.0},
+    "dagpi": {"limit": 5, "timeout": 15.0},
+    "reviewdb": {"limit": 4, "timeout": 10.0},
+    "urban": {"limit": 4, "timeout": 10.0},
+    "tenor": {"limit": 4, "timeout": 10.0},
+    # uploads of up to 100 MB
+    "litterbox": {"limit": 2, "timeout": 300.0, "retries": 0},
+    "webhooks": {"limit": 8, "timeout": 30.0},
+}
+
+
+class LatencyHistogram:
+    """Counts request latencies into fixed buckets."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * len(LATENCY_BUCKETS)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """The upper bound of the bucket the `q` (0-1) percentile falls in."""
+        if not self.count:
+            return 0.0
+
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+
+        return self.max
+
+    def __iter__(self) -> Iterator[Tuple[float, int]]:
+        return zip(LATENCY_BUCKETS, self.counts)
+
+
+class CircuitBreaker:
+    """Stops sending requests to an upstream that keeps failing.
+
+    After `threshold` failures in a row the breaker opens and every request
+    is refused for `reset_after` seconds. Then a single request is let
+    through, its result decides whether the breaker closes or stays open.
+    """
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0) -> None:
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures: int = 0
+        self.opened_at: Optional[float] = None
+        self.trips: int = 0
+        self._probing: bool = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+
+        return False
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.threshold:
+            if self.opened_at is None:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+
+        self._probing = False
+
+    def release(self) -> None:
+        """Gives up a probe that ended without telling us anything, like a cancel."""
+        self._probing = False
+
+
+class Upstream:
+    """One external API with its own connection pool, timeouts and breaker.
+
+    Every upstream gets a separate session and connector, so a slow API can
+    only ever hold `limit` sockets and can't starve the others. Idempotent
+    requests are retried with jittered backoff on connection errors,
+    timeouts and the statuses in `RETRY_STATUSES`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        limit: int = 10,
+        timeout: float = 15.0,
+        connect_timeout: float = 5.0,
+        retries: int = 2,
+        keepalive: float = 30.0,
+        dns_ttl: int = 300,
+        failure_threshold: int = 5,
+        reset_after: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.limit = limit
+        self.retries = retries
+        self.keepalive = keepalive
+        self.dns_ttl = dns_ttl
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout, sock_connect=connect_timeout
+        )
+        self.breaker = CircuitBreaker(failure_threshold, reset_after)
+        self.latency = LatencyHistogram()
+        self.requests: int = 0
+        self.errors: int = 0
+        self.retried: int = 0
+        self.refused: int = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def __repr__(self) -> str:
+        return f"<Upstream name={self.name!r} limit={self.limit} breaker={self.breaker.state!r}>"
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The upstream's own session, for libraries that want one (like webhooks)."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout, headers=base_header
+            )
+
+        return self._session
+
+    def _backoff(
+        self, attempt: int, response: Optional[aiohttp.ClientResponse]
+    ) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), 10.0)
+
+        return random.uniform(0, 0.25 * 2**attempt)
+
+    @contextlib.asynccontextmanager
+    async def request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Works like `ClientSession.request`, raises `UpstreamUnavailable` when
+        the upstream can't be reached or its breaker is open."""
+        if not self.breaker.allow():
+            self.refused += 1
+            raise UpstreamUnavailable(
+                f"{self.name.title()} isn't responding right now, try again in a bit."
+            )
+
+        retries = self.retries if method.upper() in IDEMPOTENT_METHODS else 0
+        response: Optional[aiohttp.ClientResponse] = None
+        attempt = 0
+
+        try:
+            while True:
+                self.requests += 1
+                start = time.perf_counter()
+                try:
+                    response = await self.session.request(method, url, **kwargs)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    self.latency.observe(time.perf_counter() - start)
+                    self.errors += 1
+                    if attempt >= retries:
+                        self.breaker.failure()
+                        raise UpstreamUnavailable(
+                            f"Couldn't reach {self.name.title()}, try again in a bit."
+                        ) from e
+                else:
+                    self.latency.observe(time.perf_counter() - start)
+                    if response.status not in RETRY_STATUSES or attempt >= retries:
+                        break
+
+                    self.errors += 1
+                    response.release()
+
+                self.retried += 1
+                await asyncio.sleep(self._backoff(attempt, response))
+                response = None
+                attempt += 1
+        except BaseException:
+            self.breaker.release()
+            raise
+
+        if response.status >= 500:
+            self.errors += 1
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+
+        try:
+            yield response
+        finally:
+            response.release()
+
+    def get(self, url: str, **kwargs: Any):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any):
+        return self.request("POST", url, **kwargs)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class Upstreams(Mapping[str, Upstream]):
+    """The bot's upstreams by name, `DEFAULT_UPSTREAMS` updated with the config."""
+
+    def __init__(self, config: Optional[Mapping[str, UpstreamConfig]] = None) -> None:
+        config = config or {}
+        self._upstreams: Dict[str, Upstream] = {
+            name: Upstream(name, **{**DEFAULT_UPSTREAMS.get(name, {}), **options})
+            for name, options in {**DEFAULT_UPSTREAMS, **config}.items()
+        }
+
+    def __getitem__(self, name: str) -> Upstream:
+        return self._upstreams[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._upstreams)
+
+    def __len__(self) -> int:
+        return len(self._upstreams)
+
+    async def close(self) -> None:
+        await asyncio.gather(*(upstream.close() for upstream in self.values()))
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+import yt_dlp
+
+from .errors import DownloadError, VideoIsLive
+
+MAX_FILESIZE = 100_000_000
+
+
+def match_filter(info: Dict[Any, Any]):
+    if info.get("live_status", None) == "is_live":
+        raise VideoIsLive()
+
+
+# everything below `_instances` runs inside the worker processes
+
+# the format and postprocessors are baked into a YoutubeDL when it's built,
+# so each worker keeps one warm instance per combination it has been asked for
+_instances: Dict[Tuple[str, bool, Optional[str]], yt_dlp.YoutubeDL] = {}
+
+
+def _get_instance(format: str, audio: bool, cookies: Optional[str]) -> yt_dlp.YoutubeDL:
+    key = (format, audio, cookies)
+    try:
+        return _instances[key]
+    except KeyError:
+        pass
+
+    options: Dict[Any, Any] = {
+        "outtmpl": {"default": "files/downloads/%(id)s.%(ext)s"},
+        "quiet": True,
+        "max_filesize": MAX_FILESIZE,
+        "match_filter": match_filter,
+    }
+
+    if cookies:
+        options["cookiefile"] = cookies
+
+    if audio:
+        options["postprocessors"] = [
+            {
+                "key": "FFmpegExtractAudio",
+                "preferredcodec": format,
+                "preferredquality": "192",
+            }
+        ]
+        options["format"] = "bestaudio/best"
+    else:
+        options["format"] = f"bestvideo+bestaudio[ext={format}]/best"
+
+    ydl = _instances[key] = yt_dlp.YoutubeDL(options)
+    return ydl
+
+
+def _warm() -> None:
+    _get_instance("mp4", False, None)
+    # loads every extractor class up front instead of on the first download
+    yt_dlp.extractor.gen_extractor_classes()
+
+
+def _download(
+    url: str, outtmpl: str, format: str, audio: bool, cookies: Optional[str]
+) -> str:
+    ydl = _get_instance(format, audio, cookies)
+    ydl.params["outtmpl"]["default"] = outtmpl
+
+    try:
+        info = ydl.extract_info(url, download=True)
+    except DownloadError:
+        raise
+    # these have to be pickled back to the bot, keep only the message
+    except (ValueError, yt_dlp.utils.YoutubeDLError) as e:
+        raise DownloadError(str(e)) from None
+
+    if info is None:
+        raise DownloadError("Nothing was downloaded from that link.")
+
+    requested = info.get("requested_downloads")
+    if requested and requested[0].get("filepath"):
+        return requested[0]["filepath"]
+
+    return ydl.prepare_filename(info)
+
+
+class YtdlPool:
+    """Runs yt-dlp downloads in long-lived worker processes.
+
+    Workers keep their YoutubeDL instances and loaded extractors between
+    jobs instead of building them for every download, and extraction runs
+    outside the bot's process so it doesn't compete for the GIL with the
+    gateway. Each worker is replaced after `jobs_per_worker` jobs to put a
+    bound on anything yt-dlp leaks.
+    """
+
+    def __init__(self, workers: int = 2, *, jobs_per_worker: int = 25) -> None:
+        self.workers = workers
+        self.jobs_per_worker = jobs_per_worker
+        self.jobs: int = 0
+        self.failures: int = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __repr__(self) -> str:
+        return f"<YtdlPool workers={self.workers} jobs={self.jobs}>"
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=self.jobs_per_worker,
+            )
+
+        return self._executor
+
+    def start(self) -> None:
+        """Starts the workers in the background so the first downloads don't wait on them."""
+        for _ in range(self.workers):
+            self.executor.submit(_warm)
+
+    async def download(
+        self,
+        url: str,
+        outtmpl: str,
+        format: str,
+        *,
+        audio: bool = False,
+        cookies: Optional[str] = None,
+    ) -> str:
+        """Downloads `url` in a worker and returns the path of the file."""
+        loop = asyncio.get_running_loop()
+        self.jobs += 1
+
+        try:
+            return await loop.run_in_executor(
+                self.executor,
+                functools.partial(_download, url, outtmpl, format, audio, cookies),
+            )
+        except BrokenProcessPool:
+            # a worker died mid-job, the executor can't be used after that
+            self.failures += 1
+            self._executor = None
+            raise DownloadError("The download worker crashed, try again.")
+        except Exception:
+            self.failures += 1
+            raise
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None